@@ -16,16 +16,19 @@ limitations under the License.
 """
 
 
-import os
 import streamlit as st
-from pybatfish.question import load_questions
-from pybatfish.client.commands import (
-    bf_session,
-    bf_set_network,
-    bf_init_snapshot,
-    bf_set_snapshot,
-    bf_delete_snapshot,
+from pages.common.sessions import DEFAULT_NETWORK, get_hosts, get_pool
+from pages.common.queries import (
+    attach_snapshots,
+    delete_snapshot,
+    fork_registry,
+    ingest_snapshot,
+    list_snapshots,
 )
+from pages.common.backend import get_backend
+from pages.common.metrics import bind_session
+from pages.common.presenter import display_metrics
+from pages.common.catalog import get_catalog
 import logging
 import socket
 
@@ -68,7 +71,7 @@ information. The files must be organized in a specific folder structure. In
 Bat-Q, the folders must be compressed in .zip file.
 """
 
-BASE_NETWORK_NAME = "NETWORK"
+BASE_NETWORK_NAME = DEFAULT_NETWORK
 
 # Initialize the session state
 
@@ -86,6 +89,10 @@ if "cats" not in st.session_state:
     # cats holds the former selection of questions
     st.session_state.cats = {}
 
+if "ingested" not in st.session_state:
+    # ingested maps uploaded files to the names of their snapshots
+    st.session_state.ingested = {}
+
 # End session states
 
 
@@ -117,15 +124,16 @@ def test_connection(host, port=9996):
 
 
 @st.cache_data
-def init_host(host, network):
+def init_host(hosts, network):
     """
-    Initializes Batfish session. Because of the @st.cache_data decorator, this
-    is called only once.
+    Initializes the pools of Batfish sessions and re-attaches the snapshots of
+    the catalog that are still on the servers. Because of the @st.cache_data
+    decorator, this is called only once.
 
     Parameters
     ----------
-    host : str
-        Host address.
+    hosts : tuple
+        Host addresses.
     network : str
         Name of the Batfish network.
 
@@ -134,31 +142,45 @@ def init_host(host, network):
     None.
 
     """
-    bf_session.host = host
-    bf_set_network(network)
-    load_questions()
-
-    # Delete existing snapshots
-    for snapshot in bf_session.list_snapshots():
-        bf_delete_snapshot(snapshot)
-
-
-@st.cache_data
-def init_snapshot(config_file, snapshot):
-    bf_session.init_snapshot(config_file, name=snapshot, overwrite=True)
+    for host in hosts:
+        get_pool(host, network)
+    attach_snapshots()
 
 
 def upload_snapshot():
     uploaded_file = st.sidebar.file_uploader("Add network snapshot", type="zip")
-    if uploaded_file:
+
+    # The file stays in the uploader between reruns, upload it only once
+    if uploaded_file and uploaded_file.file_id not in st.session_state.ingested:
         new_name = uploaded_file.name.split(".")[0]
         try:
-            bf_init_snapshot(uploaded_file, name=new_name, overwrite=True)
-            bf_set_snapshot(new_name)
+            name, created = ingest_snapshot(uploaded_file, new_name)
+            st.session_state.ingested[uploaded_file.file_id] = name
+            if not created:
+                st.sidebar.info(f"File {uploaded_file.name} is the same as {name}.")
         except:
             st.sidebar.error(f"File {uploaded_file.name} is not recognized!")
 
 
+def display_catalog():
+    import pandas as pd
+
+    catalog = pd.DataFrame(get_catalog().entries())
+    if catalog.empty:
+        st.write("No snapshots were uploaded with Bat-Q.")
+    else:
+        catalog["uploaded"] = pd.to_datetime(catalog["uploaded"], unit="s")
+        st.dataframe(catalog, use_container_width=True, hide_index=True)
+
+
+def display_servers(backend):
+    import pandas as pd
+    from pages.common.shards import shard_columns
+
+    status = pd.DataFrame(backend.router.status(), columns=shard_columns)
+    st.dataframe(status, use_container_width=True, hide_index=True)
+
+
 def find_index(lst, item):
     try:
         index = lst.index(item)
@@ -167,23 +189,34 @@ def find_index(lst, item):
         return 0
 
 
-bf_host = os.getenv("BATFISH_SERVER") or "127.0.0.1"
+bf_hosts = get_hosts()
 
 st.set_page_config(layout="wide")
+bind_session(st.session_state)
 st.title("Bat-Q")
 
 with st.expander("About", expanded=False):
     st.markdown(INTRO)
 
-msg = test_connection(bf_host)
+backend = get_backend()
+msgs = [test_connection(host) for host in bf_hosts] if backend.needs_server else []
+msg = "  \n".join(msgs) if msgs and all(msgs) else ""
 if msg == "":
-    init_host(bf_host, BASE_NETWORK_NAME)
+    init_host(tuple(bf_hosts), BASE_NETWORK_NAME)
 
     upload_snapshot()
-    st.markdown(f"**Batfish Server:** {bf_host}")
-
-    # Get all the snapshots in the current session
-    snapshots = bf_session.list_snapshots()
+    if backend.needs_server:
+        st.markdown(f"**Batfish Server:** {', '.join(bf_hosts)}")
+        for warning in filter(None, msgs):
+            st.warning(warning)
+        if len(bf_hosts) > 1:
+            with st.expander("Batfish Servers", expanded=False):
+                display_servers(backend)
+    if backend.name != "live":
+        st.markdown(f"**Backend:** {backend.name} ({backend.store.directory})")
+
+    # Get the snapshots on the server, without the failure forks
+    snapshots = list_snapshots()
 
     if snapshots:
         st.header("Select Snapshots", help=SNAPSHOT)
@@ -201,7 +234,7 @@ if msg == "":
         )
 
         # if the index of the returned selection is different:
-        st.session_state.activesnap["name"] = bf_set_snapshot(select_snapshot)
+        st.session_state.activesnap["name"] = select_snapshot
         # This resets the lists when Home pages is visited
         st.session_state.activesnap["failednodes"] = []
         st.session_state.activesnap["failedinfs"] = []
@@ -220,10 +253,21 @@ if msg == "":
         )
 
         if st.sidebar.button("Delete Snapshot"):
-            bf_delete_snapshot(select_snapshot)
+            fork_registry.drop_base(select_snapshot)
+            delete_snapshot(select_snapshot)
+            st.session_state.ingested = {
+                k: v
+                for k, v in st.session_state.ingested.items()
+                if v != select_snapshot
+            }
             st.session_state.activesnap = {}
             st.rerun()
+
+        with st.expander("Snapshot Catalog", expanded=False):
+            display_catalog()
     else:
         st.warning("Upload a network snapshot.")
 else:
     st.error(msg)
+
+display_metrics()
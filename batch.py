@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Runs a saved question set (select_questions.yaml from the Questions page)
+against one or more snapshots without the Streamlit app:
+
+    python batch.py select_questions.yaml snapshot1.zip snapshot2 -o answers
+
+Snapshots given as .zip files are uploaded first, other names must exist on
+the Batfish server set by BATFISH_SERVER.
+"""
+
+import os
+import sys
+import argparse
+import logging
+import yaml
+from pages.common.queries import ingest_snapshot, run_queries
+from pages.common.presenter import (
+    filter_questions,
+    flatten_filter_answer,
+    format_result,
+)
+from pages.common.registry import get_registry
+from pages.common.utils import arrow_safe, convert_template, safe_name
+
+logging.getLogger("pybatfish").setLevel(logging.WARNING)
+
+
+def load_questions(path):
+    with open(path) as f:
+        return convert_template(yaml.safe_load(f)["questions"])
+
+
+def prepare_snapshot(snapshot):
+    """
+    Uploads a snapshot zip file and returns the snapshot name. Names of
+    snapshots on the server are returned as is.
+    """
+    if not (snapshot.endswith(".zip") and os.path.isfile(snapshot)):
+        return snapshot
+
+    name = os.path.basename(snapshot).split(".")[0]
+    with open(snapshot, "rb") as f:
+        name, _ = ingest_snapshot(f, name)
+    return name
+
+
+def write_answer(fun, answer, path, file_format):
+    """
+    Writes the formatted answer frame and returns the file path. Filter
+    answers are flattened into typed flow and trace columns.
+    """
+    if fun in filter_questions:
+        frame = flatten_filter_answer(answer.frame(), answer.rows)
+    else:
+        frame, _ = format_result(answer.frame())
+    frame = arrow_safe(frame)
+
+    if file_format == "parquet":
+        path += ".parquet"
+        frame.to_parquet(path, index=False)
+    else:
+        path += ".json"
+        frame.to_json(path, orient="records", indent=1)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Bat-Q questions headless.")
+    parser.add_argument("questions", help="question YAML file")
+    parser.add_argument("snapshots", nargs="+", help="snapshot zip files or names")
+    parser.add_argument("-o", "--output", default="answers", help="output folder")
+    parser.add_argument(
+        "-f", "--format", choices=["parquet", "json"], default="parquet"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=None, help="questions run in parallel"
+    )
+    args = parser.parse_args(argv)
+
+    qs = load_questions(args.questions)
+    failed = 0
+
+    registry = get_registry()
+    for q in qs:
+        missing = registry.missing_inputs(q["fun"], q.get("options"))
+        if missing:
+            print(f"{q['name']}: missing inputs {', '.join(missing)}", file=sys.stderr)
+
+    for snapshot in args.snapshots:
+        name = prepare_snapshot(snapshot)
+        folder = os.path.join(args.output, safe_name(name))
+        os.makedirs(folder, exist_ok=True)
+
+        for idx, answer in run_queries(qs, snapshot=name, max_workers=args.workers):
+            question = qs[idx]["name"]
+            if answer is None:
+                print(f"{name}: {question}: no answer", file=sys.stderr)
+                failed += 1
+                continue
+
+            path = os.path.join(folder, safe_name(question))
+            try:
+                path = write_answer(qs[idx]["fun"], answer, path, args.format)
+                print(f"{name}: {question}: {path}")
+            except Exception as e:
+                print(f"{name}: {question}: {e}", file=sys.stderr)
+                failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compares presenter.format_result with the original per-cell implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_format_result [rows ...]
+"""
+
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from pybatfish.datamodel.primitives import ListWrapper
+from pages.common.presenter import format_result
+from benchmarks.synthetic import synthetic_routes
+
+nan = float("NaN")
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+
+def format_result_legacy(result):
+    """
+    The original implementation of presenter.format_result.
+    """
+    for c in result.columns:
+        result[c] = result[c].apply(
+            lambda y: nan if isinstance(y, list) and len(y) == 0 else y
+        )
+
+    result = result.replace("", nan)
+
+    filtered_df = result.dropna(axis=1, how="all")
+    filtered_df = filtered_df.replace(nan, "")
+
+    removed = set(result.columns) - set(filtered_df.columns)
+
+    return filtered_df, removed
+
+
+def edge_cases():
+    """
+    Returns a frame with the empty values that only some cells treat as empty.
+    """
+    return pd.DataFrame(
+        {
+            "Strings": ["", "a", nan],
+            "Lists": [[], ["a"], nan],
+            "Wrapped": [ListWrapper([]), ListWrapper([]), nan],
+            "Wrapped_Mixed": [ListWrapper([]), ListWrapper(["a"]), 1],
+            "Empty": ["", [], nan],
+            "Dicts": [{}, {}, {}],
+            "Tuples": [(), ("a",), ()],
+            "Sets": [set(), {"a"}, nan],
+            "Numbers": [0, 1, 2],
+        }
+    )
+
+
+def measure(fun, frame):
+    """
+    Returns the run time (s) and the peak memory (MB) of fun(frame).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fun(frame)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main(scales):
+    # Both implementations must produce the same result
+    for frame in [synthetic_routes(1000), edge_cases()]:
+        expected, expected_removed = format_result_legacy(frame.copy())
+        result, removed = format_result(frame)
+        assert removed == expected_removed, (removed, expected_removed)
+        pd.testing.assert_frame_equal(
+            result.astype(str), expected.astype(str), check_dtype=False
+        )
+
+    print(f"{'rows':>10} {'impl':>8} {'time (s)':>10} {'peak (MB)':>10}")
+    for rows in scales:
+        frame = synthetic_routes(rows)
+        for name, fun in [("legacy", format_result_legacy), ("current", format_result)]:
+            elapsed, peak = measure(fun, frame.copy())
+            print(f"{rows:>10} {name:>8} {elapsed:>10.3f} {peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SCALES)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Measures the cold import time of the Bat-Q modules, each in a fresh Python
+process, and checks that heavy dependencies are not loaded at import time.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_import_time
+
+The exit code is 1 if a module exceeds its budget (in seconds, scaled by
+BATQ_IMPORT_BUDGET_SCALE) or loads a deferred dependency.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+# module -> import time budget (s)
+budgets = {
+    "pages.common.queries": 0.5,
+    "pages.common.inventory": 0.5,
+    "pages.common.sweep": 0.5,
+    "pages.common.presenter": 2.0,
+    "pages.common.utils": 0.2,
+}
+
+# Loaded only when a code path needs them
+deferred = ["pybatfish", "networkx", "matplotlib"]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {deferred!r} if m in sys.modules)]))
+"""
+
+
+def measure(module):
+    """
+    Returns the import time of a module and the deferred dependencies it
+    loaded.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, deferred=deferred)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    scale = float(os.getenv("BATQ_IMPORT_BUDGET_SCALE") or 1)
+    failed = False
+
+    print(f"{'module':<28} {'time (s)':>9} {'budget':>7}  loaded")
+    for module, budget in budgets.items():
+        elapsed, loaded = measure(module)
+        over = elapsed > budget * scale or loaded
+        failed = failed or over
+        flag = "FAIL" if over else ""
+        print(
+            f"{module:<28} {elapsed:>9.3f} {budget * scale:>7.2f}"
+            f"  {', '.join(loaded)} {flag}"
+        )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Benchmark suite for the query and presentation hot paths, run on synthetic
+answers at several scales. Reports the best run time and the peak memory of
+every case and compares them with a saved baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.run              # compare with benchmarks/baseline.json
+    python -m benchmarks.run --save       # save the results as the new baseline
+    python -m benchmarks.run --quick      # smaller scales only
+
+The exit code is 1 if a case is slower than the baseline by more than the
+tolerance factor.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from collections import namedtuple
+import matplotlib
+import pandas as pd
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+from pages.common import layout  # noqa: E402
+from pages.common.plotting import (  # noqa: E402
+    get_routing_topology,
+    get_topology,
+    plot_figure,
+)
+from pages.common.presenter import (  # noqa: E402
+    DEFAULT_TRACE_TABS,
+    flatten_filter_answer,
+    flatten_traces,
+    format_result,
+    format_result_lite,
+    json_to_dataframe,
+    summarize_traces,
+    trace_variants,
+)
+from pages.common.utils import convert_template  # noqa: E402
+from benchmarks.synthetic import (  # noqa: E402
+    Interface,
+    synthetic_edges,
+    synthetic_filter_answer,
+    synthetic_qlist,
+    synthetic_routes,
+    synthetic_trace,
+    synthetic_trace_rows,
+)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_TOLERANCE = 1.5
+
+# name, scales, quick scales, setup(scale) -> argument, run(argument)
+Case = namedtuple("Case", ["name", "scales", "quick", "setup", "run"])
+
+
+def display_trace_data(rows):
+    """
+    The data preparation of presenter.display_traces for every trace column
+    of the answer, showing the first trace when there are many.
+    """
+    for variant in trace_variants:
+        if not rows or variant not in rows[0]:
+            continue
+
+        summary = summarize_traces(rows, variant)
+        if len(summary) <= DEFAULT_TRACE_TABS:
+            traces = flatten_traces(rows, [variant])
+            list(traces.groupby(["Row", "Trace"], sort=True))
+            continue
+
+        summary.groupby(["Disposition", "Final_Node", "Hops"], dropna=False).size()
+        trace = summary.iloc[0]
+        json_to_dataframe(rows[trace["Row"]][variant][trace["Trace"]])
+
+
+def check_topology():
+    """
+    Checks that links listed in both directions are loaded once and keep the
+    values of both ends, also for loops.
+    """
+    a, b = Interface("a", "eth0"), Interface("b", "eth1")
+    loop, back = Interface("a", "eth2"), Interface("a", "eth3")
+    g = get_topology(
+        pd.DataFrame(
+            {"Interface": [a, b, loop, back], "Remote_Interface": [b, a, back, loop]}
+        )
+    )
+    assert sorted(i for _, _, i in g.edges(data="interfaces")) == [
+        (("a", "eth0"), ("b", "eth1")),
+        (("a", "eth2"), ("a", "eth3")),
+    ]
+    assert all(m == 1 for _, _, m in g.edges(data="multiplicity"))
+
+    g = get_routing_topology(
+        pd.DataFrame(
+            {
+                "Node": ["a", "a", "a"],
+                "Remote_Node": ["b", "a", "a"],
+                "IP": ["1", "2", "3"],
+                "Remote_IP": ["4", "3", "2"],
+            }
+        )
+    )
+    assert sorted(ips for _, _, ips in g.edges(data="ips")) == [
+        (("a", "1"), ("b", "4")),
+        (("a", "2"), ("a", "3")),
+    ]
+
+
+def draw_topology(g):
+    # Start without cached positions to measure the layout itself
+    layout._layouts.clear()
+    layout._positions.clear()
+    plt.close(plot_figure(g))
+
+
+cases = [
+    Case(
+        "format_result",
+        [10_000, 100_000, 1_000_000],
+        [10_000, 100_000],
+        synthetic_routes,
+        format_result,
+    ),
+    Case(
+        "format_result_lite",
+        [10_000, 100_000, 1_000_000],
+        [10_000, 100_000],
+        synthetic_routes,
+        format_result_lite,
+    ),
+    Case(
+        "json_to_dataframe",
+        [10, 100, 1000],
+        [10, 100],
+        synthetic_trace,
+        json_to_dataframe,
+    ),
+    Case(
+        "flatten_traces",
+        [10, 100, 1000],
+        [10, 100],
+        synthetic_trace_rows,
+        flatten_traces,
+    ),
+    Case(
+        "display_trace_data",
+        [10, 100, 1000],
+        [10, 100],
+        synthetic_trace_rows,
+        display_trace_data,
+    ),
+    Case(
+        "summarize_traces",
+        [10, 100, 1000],
+        [10, 100],
+        synthetic_trace_rows,
+        lambda rows: summarize_traces(rows, "Traces"),
+    ),
+    Case(
+        "flatten_filter_answer",
+        [1000, 10_000, 100_000],
+        [1000, 10_000],
+        synthetic_filter_answer,
+        lambda answer: flatten_filter_answer(*answer),
+    ),
+    Case(
+        "get_topology",
+        [100, 1000, 5000],
+        [100, 1000],
+        synthetic_edges,
+        get_topology,
+    ),
+    Case(
+        "plot_figure",
+        [50, 200, 1000],
+        [50, 200],
+        lambda n: get_topology(synthetic_edges(n)),
+        draw_topology,
+    ),
+    Case(
+        "convert_template",
+        [10, 100, 1000],
+        [10, 100],
+        synthetic_qlist,
+        convert_template,
+    ),
+]
+
+
+def measure(case, scale, repeat):
+    """
+    Returns the best run time (s) and the peak memory (MB) of a case.
+    """
+    arg = case.setup(scale)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.run(arg)
+        best = min(best, time.perf_counter() - start)
+
+    # Memory is traced in a separate run because tracing slows the code down
+    tracemalloc.start()
+    case.run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak / 2**20
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Bat-Q benchmarks.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="save as baseline")
+    parser.add_argument("--quick", action="store_true", help="small scales only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("cases", nargs="*", help="run only these cases")
+    args = parser.parse_args(argv)
+
+    check_topology()
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+
+    print(f"{'case':<20} {'scale':>9} {'time (s)':>10} {'peak (MB)':>10} {'ratio':>7}")
+    for case in cases:
+        if args.cases and case.name not in args.cases:
+            continue
+
+        for scale in case.quick if args.quick else case.scales:
+            elapsed, peak = measure(case, scale, args.repeat)
+            key = f"{case.name}@{scale}"
+            results[key] = {"time": elapsed, "peak_mb": peak}
+
+            ratio = ""
+            if key in baseline and baseline[key]["time"] > 0:
+                value = elapsed / baseline[key]["time"]
+                ratio = f"{value:.2f}"
+                if value > args.tolerance:
+                    regressions.append(key)
+                    ratio += " !"
+            print(
+                f"{case.name:<20} {scale:>9} {elapsed:>10.4f} {peak:>10.1f} {ratio:>7}"
+            )
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Synthetic Batfish answers of realistic shape for the benchmarks.
+"""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+nan = float("NaN")
+
+
+class Interface(namedtuple("Interface", ["hostname", "interface"])):
+    """
+    Stands in for pybatfish.datamodel.Interface.
+    """
+
+    def __str__(self):
+        return f"{self.hostname}[{self.interface}]"
+
+
+def synthetic_routes(rows, seed=0):
+    """
+    Returns a frame shaped like a `routes` answer.
+    """
+    rng = np.random.default_rng(seed)
+    nodes = np.array([f"router{i}" for i in range(400)], dtype=object)
+    protocols = np.array(["bgp", "ospf", "static", "connected"], dtype=object)
+    communities = np.empty(rows, dtype=object)
+    communities[:] = [[] if i % 3 else ["65000:100"] for i in range(rows)]
+    next_hops = rng.integers(0, 2**32, rows).astype(str).astype(object)
+    next_hops[rng.random(rows) < 0.2] = ""
+
+    return pd.DataFrame(
+        {
+            "Node": nodes[rng.integers(0, len(nodes), rows)],
+            "VRF": "default",
+            "Network": [f"10.{i % 256}.{i // 256 % 256}.0/24" for i in range(rows)],
+            "Next_Hop_IP": next_hops,
+            "Next_Hop_Interface": "",
+            "Protocol": protocols[rng.integers(0, len(protocols), rows)],
+            "Metric": rng.integers(0, 100, rows),
+            "Admin_Distance": rng.integers(0, 255, rows),
+            "Tag": nan,
+            "Communities": communities,
+            "Empty_List": [[] for _ in range(rows)],
+        }
+    )
+
+
+def synthetic_trace(hops, steps=3, disposition="ACCEPTED"):
+    """
+    Returns a trace in the JSON form of answer rows.
+    """
+    return {
+        "disposition": disposition,
+        "hops": [
+            {
+                "node": {"name": f"router{h}"},
+                "steps": [
+                    {
+                        "type": "RoutingStep",
+                        "action": "FORWARDED",
+                        "detail": {
+                            "routes": [{"network": "10.0.0.0/24"}],
+                            "outputInterface": f"Ethernet{s}",
+                        },
+                    }
+                    for s in range(steps)
+                ],
+            }
+            for h in range(hops)
+        ],
+    }
+
+
+def synthetic_trace_rows(flows, traces=4, hops=8):
+    """
+    Returns the rows of a `reachability` answer.
+    """
+    return [
+        {
+            "Flow": {"srcIp": f"10.0.{f % 256}.1", "dstIp": "8.8.8.8"},
+            "Traces": [
+                synthetic_trace(hops, disposition="ACCEPTED" if t else "DENIED_IN")
+                for t in range(traces)
+            ],
+        }
+        for f in range(flows)
+    ]
+
+
+def synthetic_filter_rows(rows):
+    """
+    Returns the rows of a `testFilters` answer.
+    """
+    return [
+        {
+            "Node": f"router{i % 400}",
+            "Filter_Name": f"acl{i % 50}",
+            "Flow": {
+                "srcIp": f"10.0.{i % 256}.1",
+                "dstIp": "192.168.0.1",
+                "ipProtocol": "TCP",
+                "srcPort": 49152 + i % 1000,
+                "dstPort": 443,
+            },
+            "Action": "PERMIT" if i % 2 else "DENY",
+            "Line_Content": f"permit tcp any any eq {i % 1000}",
+            "Trace": [
+                {
+                    "traceElement": {
+                        "fragments": [
+                            {"text": "Matched line "},
+                            {
+                                "text": f"{i % 1000}",
+                                "vendorStructureId": {
+                                    "filename": "configs/router.cfg",
+                                    "structureType": "extended ipv4 access-list",
+                                    "structureName": f"acl{i % 50}",
+                                },
+                            },
+                        ]
+                    },
+                    "children": [],
+                }
+            ],
+        }
+        for i in range(rows)
+    ]
+
+
+def synthetic_filter_answer(rows):
+    """
+    Returns the frame and the rows of a `testFilters` answer.
+    """
+    rows = synthetic_filter_rows(rows)
+    return pd.DataFrame.from_records(rows), rows
+
+
+def synthetic_edges(nodes, degree=4, seed=0):
+    """
+    Returns a frame shaped like a `layer3Edges` answer, with every link listed
+    in both directions.
+    """
+    rng = np.random.default_rng(seed)
+    interfaces = []
+    remote_interfaces = []
+    for node in range(nodes):
+        for port in range(degree // 2):
+            peer = int(rng.integers(0, nodes))
+            local = Interface(f"router{node}", f"Ethernet{port}")
+            remote = Interface(f"router{peer}", f"Ethernet{degree + port}")
+            interfaces += [local, remote]
+            remote_interfaces += [remote, local]
+
+    return pd.DataFrame(
+        {"Interface": interfaces, "Remote_Interface": remote_interfaces}
+    )
+
+
+def synthetic_qlist(questions, variants=3):
+    """
+    Returns a question selection as saved by the Questions page.
+    """
+    return {
+        f"Question {q}": {
+            "category": "Routing and Forwarding Tables",
+            "fun": "routes",
+            "variants": [{"nodes": f"router{v}"} for v in range(q % (variants + 1))],
+        }
+        for q in range(questions)
+    }
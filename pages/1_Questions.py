@@ -18,7 +18,8 @@ limitations under the License.
 import ast
 import yaml
 import streamlit as st
-from pages.common.questions import read_questions
+from pages.common.registry import get_registry, refresh_registry
+from pages.common.queries import get_question_funs
 
 QUESTIONS_INPUT = """
 Enter questions' input paramters here. For more information, 
@@ -31,43 +32,6 @@ if "cats" not in st.session_state:
     st.session_state.cats = {}
 
 
-@st.cache_data
-def get_questions_dict(questions_data):
-    """
-    Returns all questions dict with question full name as key.
-
-    """
-    return {
-        q["name"]: {
-            "fun": q["fun"],
-            "input": q.get("input"),
-            "category": cat["category"],
-        }
-        for cat in questions_data
-        for q in cat["questions"]
-    }
-
-
-@st.cache_data
-def get_categories_dict(dict_data):
-    """
-    Returns all categories dict with category name as key.
-
-    """
-    result = {}
-    for question in dict_data:
-        qdata = dict_data[question]
-        cat_qlist = result.setdefault(qdata["category"], [])
-        cat_qlist.append(
-            {
-                "name": question,
-                "input": qdata["input"],
-                "fun": qdata["fun"],
-            }
-        )
-    return result
-
-
 def get_cat_quest_dict(dict_data):
     """
     Returns all questions grouped in categories.
@@ -87,16 +51,16 @@ def update_list(key):
 def generate_input_fields(inputs, id, idx=0, defaults=None):
     input_values = {}
 
-    for input_data in inputs:
-        name = input_data["name"]
-        mandatory = "*" if not input_data.get("optional", True) else ""
+    for field in inputs:
+        name = field.name
+        mandatory = "*" if field.mandatory else ""
         value = defaults.get(name, "") if defaults else ""
 
         paramter_value = st.text_input(
             f"{name}{mandatory}", value, key=f"{id}{name}{idx}"
         )
         if paramter_value:
-            if input_data.get("type"):  # any type other than str
+            if field.type:  # any type other than str
                 try:
                     input_values[name] = ast.literal_eval(paramter_value)
                 except:
@@ -114,13 +78,13 @@ st.set_page_config(layout="wide")
 st.header("Questions")
 
 
-# Load the YAML file containing all questions
-# bf_questions = upload_questions()["Batfish"]
-bf_questions = read_questions()["Batfish"]
-quest_dict = get_questions_dict(bf_questions)
-
-# Display category selection dropdown
-category_list = [item["category"] for item in bf_questions]
+# The registry holds all questions, indexed by name and category
+if st.sidebar.button("Refresh Questions", help="Check questions with the server."):
+    try:
+        refresh_registry(get_question_funs())
+    except Exception as e:
+        st.sidebar.error(f"Unable to load questions from the server: {e}")
+registry = get_registry()
 
 # Load previously user-saved questions
 saved_questions = st.sidebar.file_uploader(
@@ -149,22 +113,20 @@ with col1:
     # st.write("Select questions by category:")
     questions_help = st.checkbox("Category Description", value=False, key="qshelp")
     # Display a multiselect list for each question category
-    for selected_category in bf_questions:
+    for selected_category in registry.categories:
 
-        category_name = selected_category.get("category", "")
+        category_name = selected_category.name
         st.markdown(f"#### {category_name}")
 
         # Show description of the category if required
         if questions_help:
-            category_desc = selected_category.get("description", "No description!")
+            category_desc = selected_category.description or "No description!"
             st.markdown(category_desc)
 
         # Get the question list to populate the multiselect widget
-        # from the main questions database
+        # from the question registry
         questions_list = [
-            item["name"]
-            for item in selected_category.get("questions")
-            if item.get("name")
+            q.name for q in registry.by_category(category_name) if q.available
         ]
 
         # Get the selected questions
@@ -172,7 +134,11 @@ with col1:
             "Select a Question",
             questions_list,
             key=category_name,
-            default=st.session_state.cats.get(category_name),
+            default=[
+                q
+                for q in st.session_state.cats.get(category_name) or []
+                if q in questions_list
+            ],
             on_change=update_list,
             kwargs={"key": category_name},  # do not change to 'args'
         )
@@ -183,9 +149,9 @@ with col1:
             if question in qlist:
                 new_qlist[question] = qlist[question]
             else:
-                # new_qlist[question] = quest_dict[question]
                 new_qlist[question] = {
-                    k: quest_dict[question][k] for k in {"category", "fun"}
+                    "category": registry.get(question).category,
+                    "fun": registry.get(question).fun,
                 }
 
 qlist = new_qlist
@@ -198,7 +164,7 @@ with col2:
         st.warning("Please, select some questions.")
 
     for question, data in qlist.items():
-        input_fields = quest_dict[question].get("input", [])
+        input_fields = registry.get(question).inputs if question in registry else ()
 
         if data.get("variants"):  # there are at least one set of options
 
@@ -16,8 +16,15 @@ limitations under the License.
 """
 
 import streamlit as st
-from pages.common.queries import run_query, set_snapshot
-from pages.common.presenter import display_result, display_options
+from pages.common.queries import run_queries
+from pages.common.presenter import (
+    display_export,
+    display_metrics,
+    display_options,
+    display_result,
+)
+from pages.common.export import ExportItem, answer_frames
+from pages.common.metrics import bind_session
 from pages.common.utils import convert_template
 import logging
 
@@ -37,6 +44,7 @@ Find more information about Batfish questions
 
 # Start Page Here
 st.set_page_config(layout="wide")
+bind_session(st.session_state)
 st.header("Network Analysis")
 # st.markdown(APP)
 
@@ -45,24 +53,59 @@ qlist = st.session_state.get("qlist")
 
 if "activesnap" in st.session_state and "name" in st.session_state.activesnap:
 
-    set_snapshot(st.session_state.activesnap["name"])
-    st.subheader(f"Snapshot: {st.session_state.activesnap['name']}")
+    active_snapshot = st.session_state.activesnap["name"]
+    st.subheader(f"Snapshot: {active_snapshot}")
 
     # Run selected questions
     if qlist:
         qs = convert_template(qlist)
         q_names = [q["name"] for q in qs]
         tabs = st.tabs(q_names)
+
+        # Each tab gets a placeholder that is filled when its answer arrives
+        placeholders = []
         for idx, tab in enumerate(tabs):
             with tab:
                 if qs[idx].get("options"):
                     display_options(qs[idx]["options"])
 
-                answer = run_query(qs[idx])
-                display_result(qs[idx]["fun"], answer)
+                placeholder = st.empty()
+                placeholder.info("Waiting for the answer...")
+                placeholders.append(placeholder)
+
+        answers = {}
+        progress = st.progress(0.0)
+        for count, (idx, answer) in enumerate(
+            run_queries(qs, snapshot=active_snapshot), 1
+        ):
+            answers[idx] = answer
+            with placeholders[idx].container():
+                display_result(qs[idx]["fun"], answer, qs[idx]["name"])
+            progress.progress(
+                count / len(qs), text=f"Answered {count} of {len(qs)} questions."
+            )
+        progress.empty()
+
+        display_export(
+            [
+                ExportItem(
+                    q["name"],
+                    q["fun"],
+                    q.get("options"),
+                    active_snapshot,
+                    None,
+                    answer_frames(q["fun"], answers.get(idx)),
+                )
+                for idx, q in enumerate(qs)
+            ],
+            "analysis",
+            f"Analysis of {active_snapshot}",
+        )
 
     else:
         st.warning("Select some questions to proceed.")
 
 else:
     st.warning("Please add a snapshot to continue.")
+
+display_metrics()
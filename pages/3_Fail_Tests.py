@@ -16,25 +16,34 @@ limitations under the License.
 """
 
 import streamlit as st
-from pages.common.queries import (
-    run_query,
-    get_node_properties,
-    get_interface_properties,
-    fork_snapshot,
+from pages.common.queries import fork_registry, run_query
+from pages.common.inventory import get_inventory
+from pages.common.presenter import display_export, display_metrics, display_result
+from pages.common.export import ExportItem, answer_frames
+from pages.common.metrics import bind_session
+from pages.common.sweep import (
+    DEFAULT_SCENARIO_LIMIT,
+    enumerate_scenarios,
+    resilience_matrix,
+    run_sweep,
 )
-from pages.common.presenter import display_result
 from pages.common.utils import convert_template
-from pages.common.queries import set_snapshot
 import logging
 
 logging.getLogger("pybatfish").setLevel(logging.WARNING)
 
+SWEEP = """
+Evaluate every failure of up to k nodes and/or interfaces and compare the
+answers to the selected questions with the answers for the active snapshot.
+"""
+
 # Get selected questions
 qlist = st.session_state.get("qlist")
 # active_snapshot = st.session_state.activesnap["name"]
 
 # Start Page Here
 st.set_page_config(layout="wide")
+bind_session(st.session_state)
 st.header("Failure Tests")
 
 
@@ -42,48 +51,125 @@ def update_failed(key):
     st.session_state.activesnap[key] = st.session_state[key]
 
 
+def manual_test(active_snapshot, nodes, interfaces):
+    # Select a node and/or an interface to fail
+    failed_nodes = st.multiselect(
+        "Select failed nodes",
+        nodes,
+        key="failednodes",
+        default=st.session_state.activesnap["failednodes"],
+        on_change=update_failed,
+        kwargs={"key": "failednodes"},  # do not change to 'args'
+    )
+
+    failed_interfaces = st.multiselect(
+        "Select failed interfaces",
+        interfaces,
+        key="failedinfs",
+        default=st.session_state.activesnap["failedinfs"],
+        on_change=update_failed,
+        kwargs={"key": "failedinfs"},  # do not change to 'args'
+    )
+
+    # Create a new snapshot by forking the active snapshot
+    # the new snapshot includes the failed components
+    if failed_nodes or failed_interfaces:
+        qs = convert_template(qlist)
+        q_names = [q["name"] for q in qs]
+        tabs = st.tabs(q_names)
+        items = []
+
+        # The lease keeps other sessions from evicting the fork while in use
+        with fork_registry.lease(
+            active_snapshot, failed_nodes, failed_interfaces
+        ) as failed_snapshot:
+            # Run selected questions
+            for idx, tab in enumerate(tabs):
+                with tab:
+                    answer = run_query(qs[idx], snapshot=failed_snapshot)
+                    display_result(qs[idx]["fun"], answer, qs[idx]["name"])
+                items.append(
+                    ExportItem(
+                        qs[idx]["name"],
+                        qs[idx]["fun"],
+                        qs[idx].get("options"),
+                        failed_snapshot,
+                        None,
+                        answer_frames(qs[idx]["fun"], answer),
+                    )
+                )
+
+        display_export(items, "failure", f"Failure test of {active_snapshot}")
+
+
+def failure_sweep(active_snapshot, nodes, interfaces):
+    st.markdown(SWEEP)
+
+    col1, col2, col3 = st.columns(3)
+    components = col1.multiselect(
+        "Components", ["Nodes", "Interfaces"], default=["Nodes"]
+    )
+    k = col2.number_input("Failures per scenario (k)", 1, 3, 1)
+    limit = col3.number_input(
+        "Maximum scenarios", 1, 10000, DEFAULT_SCENARIO_LIMIT
+    )
+
+    scenarios = enumerate_scenarios(
+        nodes if "Nodes" in components else [],
+        interfaces if "Interfaces" in components else [],
+        k,
+        limit,
+    )
+    st.write(f"**Scenarios:** {len(scenarios)}")
+
+    if scenarios and st.button("Run Sweep"):
+        qs = convert_template(qlist)
+        records = []
+        progress = st.progress(0.0)
+        for count, scenario_records in enumerate(
+            run_sweep(active_snapshot, qs, scenarios), 1
+        ):
+            records.extend(scenario_records)
+            progress.progress(
+                count / len(scenarios),
+                text=f"Evaluated {count} of {len(scenarios)} scenarios.",
+            )
+        progress.empty()
+        st.session_state.sweep = {"snapshot": active_snapshot, "records": records}
+
+    sweep = st.session_state.get("sweep")
+    if sweep and sweep["snapshot"] == active_snapshot:
+        import pandas as pd
+
+        matrix = resilience_matrix(sweep["records"])
+        details = pd.DataFrame(sweep["records"])
+        st.markdown("**Changed answers** (scenario x question):")
+        st.dataframe(matrix, use_container_width=True)
+        st.markdown("**Details:**")
+        st.dataframe(details, use_container_width=True, hide_index=True)
+
+        sweep_frames = [("matrix", matrix.reset_index()), ("records", details)]
+        display_export(
+            [ExportItem("Sweep", "sweep", None, active_snapshot, None, sweep_frames)],
+            "sweep",
+            f"Failure sweep of {active_snapshot}",
+        )
+
+
 if "activesnap" in st.session_state and "name" in st.session_state.activesnap:
-    active_snapshot = set_snapshot(st.session_state.activesnap["name"])
+    active_snapshot = st.session_state.activesnap["name"]
     st.subheader(f"Active Snapshot: {active_snapshot}")
 
     # Run selected questions
     if qlist:
         try:
-            nodes = get_node_properties()
-            interfaces = get_interface_properties()
-
-            # Select a node and/or an interface to fail
-            failed_nodes = st.multiselect(
-                "Select failed nodes",
-                nodes,
-                key="failednodes",
-                default=st.session_state.activesnap["failednodes"],
-                on_change=update_failed,
-                kwargs={"key": "failednodes"},  # do not change to 'args'
-            )
-
-            failed_interfaces = st.multiselect(
-                "Select failed interfaces",
-                interfaces,
-                key="failedinfs",
-                default=st.session_state.activesnap["failedinfs"],
-                on_change=update_failed,
-                kwargs={"key": "failedinfs"},  # do not change to 'args'
-            )
-
-            # Create a new snapshot by forking the active snapshot
-            # the new snapshot includes the failed components
-            if failed_nodes or failed_interfaces:
-                fork_snapshot(active_snapshot, failed_nodes, failed_interfaces)
+            inventory = get_inventory(active_snapshot)
 
-                # Run selected questions
-                qs = convert_template(qlist)
-                q_names = [q["name"] for q in qs]
-                tabs = st.tabs(q_names)
-                for idx, tab in enumerate(tabs):
-                    with tab:
-                        answer = run_query(qs[idx])
-                        display_result(qs[idx]["fun"], answer)
+            mode = st.radio("Mode", ["Manual", "Sweep"], horizontal=True)
+            if mode == "Manual":
+                manual_test(active_snapshot, inventory.nodes, inventory.interfaces)
+            else:
+                failure_sweep(active_snapshot, inventory.nodes, inventory.interfaces)
 
         except Exception as e:
             st.error(f"Error encountered in one of the questions: {e}")
@@ -93,3 +179,5 @@ if "activesnap" in st.session_state and "name" in st.session_state.activesnap:
 
 else:
     st.warning("Please add a snapshot to continue.")
+
+display_metrics()
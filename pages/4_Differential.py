@@ -17,7 +17,15 @@ limitations under the License.
 
 import streamlit as st
 from pages.common.queries import run_query
-from pages.common.presenter import display_result_diff
+from pages.common.presenter import (
+    display_export,
+    display_local_diff,
+    display_metrics,
+    display_result_diff,
+)
+from pages.common.metrics import bind_session
+from pages.common.export import ExportItem, answer_frames, local_diff_frames
+from pages.common.differ import needs_remote_diff
 from pages.common.utils import convert_template
 import logging
 
@@ -25,6 +33,7 @@ logging.getLogger("pybatfish").setLevel(logging.WARNING)
 
 # Start Page Here
 st.set_page_config(layout="wide")
+bind_session(st.session_state)
 st.header("Differential")
 
 
@@ -46,19 +55,43 @@ if (
         qs = convert_template(qlist)
         q_names = [q["name"] for q in qs]
         tabs = st.tabs(q_names)
+        reference = st.session_state.activesnap["name"]
+        snapshot = st.session_state.altsnap["name"]
+        items = []
         for idx, tab in enumerate(tabs):
+            fun = qs[idx]["fun"]
             with tab:
-                answer = run_query(
-                    qs[idx],
-                    (
-                        st.session_state.activesnap["name"],
-                        st.session_state.altsnap["name"],
-                    ),
+                if needs_remote_diff(fun):
+                    answer = run_query(qs[idx], (reference, snapshot))
+                    display_result_diff(fun, answer, qs[idx]["name"])
+                    frames = answer_frames(fun, answer)
+                else:
+                    # Single-snapshot answers are usually cached already
+                    reference_answer = run_query(qs[idx], snapshot=reference)
+                    snapshot_answer = run_query(qs[idx], snapshot=snapshot)
+                    display_local_diff(
+                        fun, reference_answer, snapshot_answer, qs[idx]["name"]
+                    )
+                    frames = local_diff_frames(fun, reference_answer, snapshot_answer)
+            items.append(
+                ExportItem(
+                    qs[idx]["name"],
+                    fun,
+                    qs[idx].get("options"),
+                    snapshot,
+                    reference,
+                    frames,
                 )
-                display_result_diff(qs[idx]["fun"], answer)
+            )
+
+        display_export(
+            items, "differential", f"Differences of {snapshot} from {reference}"
+        )
 
     else:
         st.warning("Select some questions to proceed.")
 
 else:
     st.warning("Please add two snapshots to continue.")
+
+display_metrics()
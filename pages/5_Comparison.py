@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import streamlit as st
+from pages.common.queries import list_snapshots, run_query, run_query_matrix
+from pages.common.presenter import display_local_diff, display_metrics
+from pages.common.metrics import bind_session
+from pages.common.differ import compare_snapshots, needs_remote_diff
+from pages.common.utils import convert_template
+import logging
+
+logging.getLogger("pybatfish").setLevel(logging.WARNING)
+
+COMPARISON = """
+Compare the answers to the selected questions for several snapshots with the
+answers for the active (baseline) snapshot. Every question is asked once per
+snapshot and the answers are reused for all comparisons.
+"""
+
+# Start Page Here
+st.set_page_config(layout="wide")
+bind_session(st.session_state)
+st.header("Comparison")
+
+# Get selected questions
+qlist = st.session_state.get("qlist")
+
+
+def run_comparison(baseline, candidates, qs):
+    snapshots = [baseline, *candidates]
+    answers = {}
+
+    total = len(snapshots) * len(qs)
+    progress = st.progress(0.0)
+    for count, (snapshot, idx, answer) in enumerate(
+        run_query_matrix(qs, snapshots), 1
+    ):
+        answers[(snapshot, idx)] = answer
+        progress.progress(count / total, text=f"Answered {count} of {total} questions.")
+    progress.empty()
+
+    row_counts, diff_sizes = compare_snapshots(qs, answers, baseline, snapshots)
+    st.session_state.comparison = {
+        "snapshots": snapshots,
+        "questions": qs,
+        "row_counts": row_counts,
+        "diff_sizes": diff_sizes,
+    }
+
+
+if "activesnap" in st.session_state and "name" in st.session_state.activesnap:
+    baseline = st.session_state.activesnap["name"]
+    st.subheader(f"Baseline snapshot: {baseline}")
+    st.markdown(COMPARISON)
+
+    if qlist:
+        all_qs = convert_template(qlist)
+        qs = [q for q in all_qs if not needs_remote_diff(q["fun"])]
+        skipped = len(all_qs) - len(qs)
+        if skipped:
+            st.write(f"{skipped} trace or differential questions are not compared.")
+
+        candidates = st.multiselect(
+            "Snapshots to compare",
+            [s for s in list_snapshots() if s != baseline],
+        )
+
+        if candidates and qs and st.button("Compare"):
+            run_comparison(baseline, candidates, qs)
+
+        comparison = st.session_state.get("comparison")
+        if comparison and comparison["snapshots"][0] == baseline:
+            st.markdown("**Rows per answer:**")
+            st.dataframe(comparison["row_counts"], use_container_width=True)
+            st.markdown("**Rows that differ from the baseline:**")
+            st.dataframe(comparison["diff_sizes"], use_container_width=True)
+
+            # Drill down into any pair of snapshots
+            st.markdown("#### Details")
+            snapshots = comparison["snapshots"]
+            q_names = [q["name"] for q in comparison["questions"]]
+            col1, col2, col3 = st.columns(3)
+            question = col1.selectbox("Question", q_names)
+            reference = col2.selectbox("Reference", snapshots, index=0)
+            snapshot = col3.selectbox("Snapshot", snapshots, index=len(snapshots) - 1)
+
+            q = comparison["questions"][q_names.index(question)]
+            display_local_diff(
+                q["fun"],
+                run_query(q, snapshot=reference),  # cached answers
+                run_query(q, snapshot=snapshot),
+                f"compare_{q['name']}",
+            )
+
+    else:
+        st.warning("Select some questions to proceed.")
+
+else:
+    st.warning("Please add a snapshot to continue.")
+
+display_metrics()
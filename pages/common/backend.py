@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Backends that answer Batfish requests. The live backend sends them to the
+Batfish server. The recording backend does the same and saves every answer
+to a store on disk, which the replay backend serves without a server. This
+lets Bat-Q run offline, for profiling and load tests.
+"""
+
+import os
+import json
+import gzip
+import time
+import pickle
+import threading
+
+from pages.common.sessions import get_hosts
+from pages.common.shards import DEFAULT_RETRY_AFTER, DEFAULT_SPOOL, ShardRouter
+from pages.common.cache import make_key
+from pages.common.snapshots import get_snapshot_hash, register_snapshot
+from pages.common.metrics import timed
+
+BACKENDS = ("live", "record", "replay")
+DEFAULT_RECORDINGS = os.path.join("~", ".batq", "recordings")
+
+
+def answer_key(fun, options, snapshot, reference_snapshot=None):
+    """
+    Returns the key of a recorded answer. Answers are recorded by snapshot
+    name, so they can be replayed where the snapshot content is unknown.
+    """
+    return make_key([snapshot, reference_snapshot or ""], fun, options)
+
+
+class LiveBackend:
+    """
+    Sends every request to the Batfish servers through a shard router.
+    """
+
+    name = "live"
+    needs_server = True
+
+    def __init__(self, router):
+        self.router = router
+
+    def answer(self, fun, options=None, snapshot=None, reference_snapshot=None):
+        def ask(bf):
+            with timed(fun, "build"):
+                question = getattr(bf.q, fun)(**(options or {}))
+            with timed(fun, "answer"):
+                return question.answer(
+                    snapshot=snapshot, reference_snapshot=reference_snapshot
+                )
+
+        return self.router.call(ask, [snapshot, reference_snapshot], questions=True)
+
+    def list_questions(self):
+        return self.router.call(
+            lambda bf: [q["name"] for q in bf.q.list()], questions=True
+        )
+
+    def list_snapshots(self):
+        return self.router.refresh()
+
+    def init_snapshot(self, upload, name):
+        self.router.init_snapshot(upload, name)
+
+    def fork_snapshot(self, base, name, failed_nodes=None, failed_interfaces=None):
+        self.router.fork_snapshot(base, name, failed_nodes, failed_interfaces)
+
+    def delete_snapshot(self, name):
+        self.router.delete_snapshot(name)
+
+
+class AnswerStore:
+    """
+    Recorded answers on disk, one compressed pickle per answer, and a
+    manifest of the question templates and snapshots seen while recording.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        self._manifest_path = os.path.join(self.directory, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        try:
+            with open(self._manifest_path) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.manifest.setdefault("questions", [])
+        self.manifest.setdefault("snapshots", {})  # name -> content hash
+
+    def _path(self, key):
+        return os.path.join(self.directory, "answers", key[:2], key + ".pkl.gz")
+
+    def get(self, key):
+        try:
+            with gzip.open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, record):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def update(self, questions=None, snapshots=None, removed=()):
+        """
+        Updates the manifest with question templates and snapshots (a dict of
+        names and hashes) and removes the snapshots that were deleted.
+        """
+        with self._lock:
+            before = json.dumps(self.manifest, sort_keys=True)
+            if questions is not None:
+                self.manifest["questions"] = list(questions)
+            known = self.manifest["snapshots"]
+            for name, digest in (snapshots or {}).items():
+                known[name] = digest or known.get(name)
+            for name in removed:
+                known.pop(name, None)
+
+            if json.dumps(self.manifest, sort_keys=True) == before:
+                return
+
+            tmp_path = f"{self._manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self._manifest_path)
+
+
+class RecordingBackend(LiveBackend):
+    """
+    Live backend that saves every answer, with the time the server took to
+    produce it, to an answer store.
+    """
+
+    name = "record"
+
+    def __init__(self, router, store):
+        super().__init__(router)
+        self.store = store
+
+    def answer(self, fun, options=None, snapshot=None, reference_snapshot=None):
+        start = time.perf_counter()
+        answer = super().answer(fun, options, snapshot, reference_snapshot)
+        elapsed = time.perf_counter() - start
+
+        self.store.put(
+            answer_key(fun, options, snapshot, reference_snapshot),
+            {
+                "fun": fun,
+                "options": options,
+                "snapshot": snapshot,
+                "reference_snapshot": reference_snapshot,
+                "elapsed": elapsed,
+                "answer": answer,
+            },
+        )
+        names = [s for s in (snapshot, reference_snapshot) if s]
+        self.store.update(snapshots={s: get_snapshot_hash(s) for s in names})
+        return answer
+
+    def list_questions(self):
+        questions = super().list_questions()
+        self.store.update(questions=questions)
+        return questions
+
+    def list_snapshots(self):
+        snapshots = super().list_snapshots()
+        self.store.update(snapshots={s: get_snapshot_hash(s) for s in snapshots})
+        return snapshots
+
+    def delete_snapshot(self, name):
+        super().delete_snapshot(name)
+        self.store.update(removed=[name])
+
+
+class ReplayBackend:
+    """
+    Serves recorded answers without a Batfish server. Each answer is delayed
+    by a fixed latency in seconds, or by the time it took to record it if
+    latency is None. Questions that were not recorded fail with LookupError.
+
+    Snapshots can be uploaded, forked and deleted, but only the questions
+    recorded for the same snapshot names have answers.
+    """
+
+    name = "replay"
+    needs_server = False
+
+    def __init__(self, store, latency=0.0):
+        self.store = store
+        self.latency = latency
+        self._snapshots = dict(store.manifest["snapshots"])
+        self._lock = threading.Lock()
+
+        # Known hashes keep fork names and cache keys the same as recorded
+        for name, digest in self._snapshots.items():
+            if digest:
+                register_snapshot(name, digest)
+
+    def answer(self, fun, options=None, snapshot=None, reference_snapshot=None):
+        record = self.store.get(answer_key(fun, options, snapshot, reference_snapshot))
+        if record is None:
+            raise LookupError(f"No recorded answer to {fun} for {snapshot}")
+
+        delay = record["elapsed"] if self.latency is None else self.latency
+        with timed(fun, "answer"):
+            if delay > 0:
+                time.sleep(delay)
+            return record["answer"]
+
+    def list_questions(self):
+        return list(self.store.manifest["questions"])
+
+    def list_snapshots(self):
+        with self._lock:
+            return list(self._snapshots)
+
+    def init_snapshot(self, upload, name):
+        with self._lock:
+            self._snapshots[name] = None
+
+    def fork_snapshot(self, base, name, failed_nodes=None, failed_interfaces=None):
+        with self._lock:
+            if base not in self._snapshots:
+                raise LookupError(f"Snapshot {base} was not recorded")
+            self._snapshots[name] = None
+
+    def delete_snapshot(self, name):
+        with self._lock:
+            self._snapshots.pop(name, None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_latency():
+    """
+    Returns the replay latency set with BATQ_REPLAY_LATENCY: a number of
+    seconds, or None for "recorded" to replay the recorded server time.
+    """
+    latency = os.getenv("BATQ_REPLAY_LATENCY") or "0"
+    return None if latency == "recorded" else float(latency)
+
+
+def get_router():
+    """
+    Returns a shard router for the servers in BATFISH_SERVER. Snapshots are
+    uploaded to BATQ_REPLICAS servers (one by default) and servers that fail
+    are skipped for BATQ_RETRY_AFTER seconds.
+    """
+    replicas = os.getenv("BATQ_REPLICAS")
+    return ShardRouter(
+        get_hosts(),
+        replicas=int(replicas) if replicas else None,
+        retry_after=float(os.getenv("BATQ_RETRY_AFTER") or DEFAULT_RETRY_AFTER),
+        spool=os.getenv("BATQ_UPLOAD_DIR") or DEFAULT_SPOOL,
+    )
+
+
+def get_backend():
+    """
+    Returns the process-wide backend selected with BATQ_BACKEND (live, record
+    or replay). Recordings are kept in BATQ_RECORDINGS.
+    """
+    global _backend
+
+    with _backend_lock:
+        if _backend is None:
+            kind = os.getenv("BATQ_BACKEND") or "live"
+            if kind not in BACKENDS:
+                raise ValueError(f"Unknown backend {kind}, use one of {BACKENDS}")
+
+            if kind == "live":
+                _backend = LiveBackend(get_router())
+            else:
+                store = AnswerStore(os.getenv("BATQ_RECORDINGS") or DEFAULT_RECORDINGS)
+                if kind == "record":
+                    _backend = RecordingBackend(get_router(), store)
+                else:
+                    _backend = ReplayBackend(store, get_latency())
+        return _backend
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import sys
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMORY_MB = 256
+DEFAULT_DISK_MB = 2048
+# Rows measured by estimate_size
+SIZE_SAMPLE = 200
+
+
+def normalize_options(options):
+    """
+    Returns question options without empty values and in a stable order.
+    """
+    if not options:
+        return {}
+    return {
+        k: v for k, v in sorted(options.items()) if v is not None and v != ""
+    }
+
+
+def deep_size(objects, seen):
+    """
+    Returns the memory size of the given objects and of the objects they refer
+    to, skipping the objects whose ids are in seen.
+    """
+    size = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, (str, bytes, int, float)):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name):
+                stack.append(getattr(obj, name))
+    return size
+
+
+def raw_rows(answer):
+    """
+    Returns the rows of an answer as they were received from Batfish.
+    """
+    try:
+        return answer["answerElements"][0]["rows"]
+    except (TypeError, LookupError):
+        return []
+
+
+def estimate_size(answer):
+    """
+    Returns the approximate memory size of an answer in bytes, so that the
+    answer does not have to be serialized. The object cells of the frame
+    (e.g. flows and traces) and the rows they were parsed from are measured on
+    a sample of rows.
+    """
+    try:
+        frame = answer.frame()
+    except Exception:
+        return len(pickle.dumps(answer, protocol=pickle.HIGHEST_PROTOCOL))
+
+    rows = getattr(answer, "rows", None) or []
+    raw = raw_rows(answer)
+    size = int(frame.memory_usage(index=True).sum())
+    count = max(len(frame), len(rows), len(raw))
+    if count:
+        step = max(1, count // SIZE_SAMPLE)
+        cells = frame.select_dtypes(include=object).to_numpy()[::step]
+        sampled = max(len(cells), len(rows[::step]), len(raw[::step]))
+        sample_size = deep_size(
+            [*cells.flat, *rows[::step], *raw[::step]], seen=set()
+        )
+        size += sample_size * count // sampled
+    return size
+
+
+def make_key(snapshot_hashes, fun, options=None):
+    """
+    Returns the cache key of a question asked against the given snapshots.
+    """
+    payload = json.dumps(
+        [list(snapshot_hashes), fun, normalize_options(options)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU cache of Batfish answers limited by memory size, with an optional
+    on-disk tier that survives restarts.
+    """
+
+    def __init__(self, max_bytes, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (answer, size)
+        self._size = 0
+        self._disk = OrderedDict()  # key -> file size, least recently used first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._index_disk()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        data = self._read_disk(key)
+        if data is None:
+            return None
+
+        try:
+            answer = pickle.loads(data)
+        except Exception:
+            return None
+
+        self._store(key, answer, estimate_size(answer))
+        return answer
+
+    def put(self, key, answer):
+        # Answers are sized alike, whether or not they are written to disk
+        if not self.directory:
+            self._store(key, answer, estimate_size(answer))
+            return
+
+        try:
+            data = pickle.dumps(answer, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Answers that cannot be serialized are not cached
+            return
+
+        self._store(key, answer, estimate_size(answer))
+        self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _store(self, key, answer, size):
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._size -= old[1]
+
+            self._entries[key] = (answer, size)
+            self._size += size
+
+            # Evict the least recently used answers
+            while self._size > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._size -= old_size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def _index_disk(self):
+        # The directory is scanned once, later writes keep the index current
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".pkl"):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_size += size
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            return None
+
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.directory:
+            return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        with self._lock:
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+
+        if self.max_disk_bytes:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        # Remove the least recently used files until the tier fits
+        evicted = []
+        with self._lock:
+            while self._disk_size > self.max_disk_bytes and self._disk:
+                key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(key)
+
+        for key in evicted:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide answer cache. The cache is configured with the
+    BATQ_CACHE_MB, BATQ_CACHE_DIR and BATQ_CACHE_DISK_MB environment variables.
+    The on-disk tier is enabled only if BATQ_CACHE_DIR is set.
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            memory_mb = float(os.getenv("BATQ_CACHE_MB") or DEFAULT_MEMORY_MB)
+            disk_mb = float(os.getenv("BATQ_CACHE_DISK_MB") or DEFAULT_DISK_MB)
+            _cache = AnswerCache(
+                int(memory_mb * 2**20),
+                directory=os.getenv("BATQ_CACHE_DIR") or None,
+                max_disk_bytes=int(disk_mb * 2**20),
+            )
+        return _cache
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    uploaded REAL NOT NULL,
+    size INTEGER,
+    devices INTEGER,
+    status TEXT
+)
+"""
+
+catalog_columns = ["name", "hash", "uploaded", "size", "devices", "status"]
+
+
+class SnapshotCatalog:
+    """
+    Persistent list of the snapshots uploaded to the Batfish server, stored in
+    a SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._execute(SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._lock, closing(sqlite3.connect(self.path)) as db:
+            with db:
+                return db.execute(sql, params).fetchall()
+
+    def add(self, name, digest, size=None, devices=None, status=None):
+        self._execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+            (name, digest, time.time(), size, devices, status),
+        )
+
+    def remove(self, name):
+        self._execute("DELETE FROM snapshots WHERE name = ?", (name,))
+
+    def entries(self):
+        """
+        Returns all snapshots as dicts, oldest first.
+        """
+        rows = self._execute(
+            f"SELECT {', '.join(catalog_columns)} FROM snapshots ORDER BY uploaded"
+        )
+        return [dict(zip(catalog_columns, row)) for row in rows]
+
+
+def plan_retention(entries, server_snapshots, now=None):
+    """
+    Applies the retention policy to the catalog entries.
+
+    Returns the entries to keep and the names of the snapshots to delete.
+    Entries whose snapshot is no longer on the server are dropped. The policy
+    is set with BATQ_RETENTION_DAYS (maximum age) and BATQ_MAX_SNAPSHOTS
+    (maximum count, newest kept).
+    """
+    now = now or time.time()
+    max_days = os.getenv("BATQ_RETENTION_DAYS")
+    max_count = os.getenv("BATQ_MAX_SNAPSHOTS")
+
+    present = set(server_snapshots)
+    entries = [e for e in entries if e["name"] in present]
+    delete = []
+
+    if max_days:
+        cutoff = now - float(max_days) * 86400
+        delete.extend(e["name"] for e in entries if e["uploaded"] < cutoff)
+        entries = [e for e in entries if e["uploaded"] >= cutoff]
+
+    if max_count and len(entries) > int(max_count):
+        excess = len(entries) - int(max_count)
+        delete.extend(e["name"] for e in entries[:excess])
+        entries = entries[excess:]
+
+    return entries, delete
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Returns the snapshot catalog stored at BATQ_CATALOG (by default in the
+    .batq folder of the user's home).
+    """
+    global _catalog
+
+    with _catalog_lock:
+        if _catalog is None:
+            path = os.getenv("BATQ_CATALOG") or os.path.join(
+                os.path.expanduser("~"), ".batq", "catalog.db"
+            )
+            _catalog = SnapshotCatalog(path)
+        return _catalog
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import pandas as pd
+from pages.common.registry import get_registry
+
+# Columns that identify a row of an answer. Rows with the same key in both
+# snapshots are compared, other rows are added or removed.
+key_columns = {
+    "routes": ["Node", "VRF", "Network", "Protocol", "Next_Hop"],
+    "bgpRib": ["Node", "VRF", "Network", "Next_Hop"],
+    "evpnRib": ["Node", "VRF", "Network", "Next_Hop"],
+    "nodeProperties": ["Node"],
+    "interfaceProperties": ["Interface"],
+    "bgpProcessConfiguration": ["Node", "VRF"],
+    "bgpPeerConfiguration": ["Node", "VRF", "Local_IP", "Remote_IP"],
+    "bgpSessionCompatibility": ["Node", "VRF", "Local_IP", "Remote_IP"],
+    "bgpSessionStatus": ["Node", "VRF", "Local_IP", "Remote_IP"],
+    "ospfProcessConfiguration": ["Node", "VRF", "Process_ID"],
+    "ospfInterfaceConfiguration": ["Interface", "VRF"],
+    "ospfSessionCompatibility": ["Interface", "Remote_Interface"],
+    "layer3Edges": ["Interface", "Remote_Interface"],
+    "userProvidedLayer1Edges": ["Interface", "Remote_Interface"],
+    "bgpEdges": ["Node", "IP", "Remote_Node", "Remote_IP"],
+    "ospfEdges": ["Interface", "Remote_Interface"],
+    "ipOwners": ["Node", "VRF", "Interface", "IP"],
+    "namedStructures": ["Node", "Structure_Type", "Structure_Name"],
+    "definedStructures": ["Structure_Type", "Structure_Name", "Source_File"],
+    "fileParseStatus": ["File_Name"],
+    "switchedVlanProperties": ["Node", "VLAN_ID"],
+    "vxlanVniProperties": ["Node", "VRF", "VNI"],
+}
+
+# Questions that are compared by the Batfish server. Differential questions
+# have no single-snapshot form and traces are compared per flow by Batfish.
+remote_diff_questions = {
+    "traceroute",
+    "bidirectionalTraceroute",
+    "reachability",
+    "differentialReachability",
+    "compareFilters",
+}
+
+
+def needs_remote_diff(fun):
+    question = get_registry().by_fun(fun)
+    return fun in remote_diff_questions or bool(question and question.differential)
+
+
+def hash_rows(frame):
+    """
+    Returns a hash of every row. Cells are compared by their text, so lists
+    and pybatfish objects can be hashed too.
+    """
+    return pd.util.hash_pandas_object(frame.astype(str), index=False)
+
+
+def keyed(frame, keys):
+    """
+    Returns the frame indexed by the hash of its key columns. Duplicate keys
+    are told apart by their order of appearance.
+    """
+    key_hash = hash_rows(frame[keys])
+    return frame.set_index(
+        [key_hash.values, key_hash.groupby(key_hash.values).cumcount().values]
+    )
+
+
+def diff_frames(reference, snapshot, keys=None):
+    """
+    Compares two answer frames.
+
+    Returns the added rows (only in the snapshot), the removed rows (only in
+    the reference) and the changed rows. The changed rows have the key columns
+    and a Reference_ and Snapshot_ column for every other column that changed.
+    """
+    columns = [c for c in reference.columns if c in snapshot.columns]
+    if not columns:
+        return snapshot, reference, pd.DataFrame()
+    keys = [c for c in keys or [] if c in columns] or columns
+
+    ref = keyed(reference[columns], keys)
+    snap = keyed(snapshot[columns], keys)
+
+    added = snap[~snap.index.isin(ref.index)]
+    removed = ref[~ref.index.isin(snap.index)]
+
+    common = ref.index.intersection(snap.index)
+    ref_common = ref.loc[common]
+    snap_common = snap.loc[common]
+    changed_rows = hash_rows(ref_common).values != hash_rows(snap_common).values
+    ref_changed = ref_common[changed_rows]
+    snap_changed = snap_common[changed_rows]
+
+    changed = ref_changed[keys].copy()
+    for c in columns:
+        if c in keys:
+            continue
+        differs = ref_changed[c].astype(str) != snap_changed[c].astype(str)
+        if differs.any():
+            changed[f"Reference_{c}"] = ref_changed[c]
+            changed[f"Snapshot_{c}"] = snap_changed[c]
+
+    return (
+        added.reset_index(drop=True),
+        removed.reset_index(drop=True),
+        changed.reset_index(drop=True),
+    )
+
+
+def diff_answers(fun, reference_answer, snapshot_answer):
+    """
+    Compares the answers to a question for two snapshots, using the key
+    columns of the question.
+    """
+    return diff_frames(
+        reference_answer.frame(), snapshot_answer.frame(), key_columns.get(fun)
+    )
+
+
+def compare_snapshots(questions, answers, baseline, snapshots):
+    """
+    Builds the comparison matrices of several snapshots.
+
+    `answers` maps (snapshot, question index) to answers. Returns the row
+    count of every answer and the number of rows that differ from the
+    baseline (added, removed or changed), as question x snapshot frames.
+    """
+    row_counts = {}
+    diff_sizes = {}
+
+    for idx, question in enumerate(questions):
+        name = question["name"]
+        base_answer = answers.get((baseline, idx))
+        row_counts[name] = {}
+        diff_sizes[name] = {}
+
+        for snapshot in snapshots:
+            answer = answers.get((snapshot, idx))
+            row_counts[name][snapshot] = len(answer.rows) if answer else None
+            if not (answer and base_answer):
+                diff_sizes[name][snapshot] = None
+            elif snapshot == baseline:
+                diff_sizes[name][snapshot] = 0
+            else:
+                added, removed, changed = diff_answers(
+                    question["fun"], base_answer, answer
+                )
+                diff_sizes[name][snapshot] = len(added) + len(removed) + len(changed)
+
+    return (
+        pd.DataFrame.from_dict(row_counts, orient="index"),
+        pd.DataFrame.from_dict(diff_sizes, orient="index"),
+    )
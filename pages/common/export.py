@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Exports the answers of a page as one zip bundle with a Parquet file per
+question and variant, and a manifest of the questions, their options and
+the content hashes of the snapshots.
+"""
+
+import io
+import os
+import json
+import time
+import atexit
+import shutil
+import zipfile
+import tempfile
+import threading
+from collections import namedtuple
+
+from pages.common.presenter import (
+    filter_questions,
+    flatten_filter_answer,
+    flatten_traces,
+    format_result,
+    trace_questions,
+)
+from pages.common.snapshots import get_snapshot_hash
+from pages.common.utils import arrow_safe, safe_name
+
+BUNDLE_VERSION = 1
+PARQUET_COMPRESSION = "zstd"
+BUNDLE_TTL = 3600  # seconds a bundle is kept for download
+
+# frames is an iterable of (variant, frame), produced while the bundle is
+# written, so only one frame is held in memory at a time
+ExportItem = namedtuple(
+    "ExportItem",
+    ["question", "fun", "options", "snapshot", "reference_snapshot", "frames"],
+)
+
+
+def items_signature(items):
+    """
+    Returns a value that changes when the questions, their options or the
+    snapshots of the export items change.
+    """
+    return json.dumps(
+        [[i.question, i.options, i.snapshot, i.reference_snapshot] for i in items],
+        sort_keys=True,
+        default=str,
+    )
+
+
+_bundle_dir = None
+_bundle_lock = threading.Lock()
+
+
+def new_bundle_path():
+    """
+    Returns the path of a new bundle in a temporary directory of the process.
+    Bundles older than BUNDLE_TTL are deleted, and the directory is removed
+    when the process exits.
+    """
+    global _bundle_dir
+
+    with _bundle_lock:
+        if _bundle_dir is None:
+            _bundle_dir = tempfile.mkdtemp(prefix="batq-export-")
+            atexit.register(shutil.rmtree, _bundle_dir, ignore_errors=True)
+
+        now = time.time()
+        for entry in os.scandir(_bundle_dir):
+            try:
+                if now - entry.stat().st_mtime > BUNDLE_TTL:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+        fd, path = tempfile.mkstemp(suffix=".zip", dir=_bundle_dir)
+        os.close(fd)
+        return path
+
+
+def answer_frames(fun, answer):
+    """
+    Yields the formatted table of an answer and, for trace questions, a table
+    of trace steps per trace column (e.g. Forward_Traces). Filter answers are
+    flattened into typed flow and trace columns.
+    """
+    if not answer:
+        return
+
+    if fun in filter_questions:
+        yield "answer", flatten_filter_answer(answer.frame(), answer.rows)
+        return
+
+    frame, _ = format_result(answer.frame())
+    yield "answer", frame
+
+    if fun in trace_questions:
+        traces = flatten_traces(answer.rows)
+        for variant, steps in traces.groupby("Variant", sort=False):
+            yield variant, steps.drop(columns="Variant")
+
+
+def local_diff_frames(fun, reference_answer, snapshot_answer):
+    """
+    Yields the rows only in the snapshot, only in the reference and changed.
+    """
+    from pages.common.differ import diff_answers
+
+    if not reference_answer or not snapshot_answer:
+        return
+
+    added, removed, changed = diff_answers(fun, reference_answer, snapshot_answer)
+    yield "added", added
+    yield "removed", removed
+    yield "changed", changed
+
+
+def write_bundle(file, items, description=""):
+    """
+    Writes the export items to a zip bundle (a path or a binary file object)
+    and returns the manifest.
+    """
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "description": description,
+        "snapshots": {},
+        "questions": [],
+    }
+
+    with zipfile.ZipFile(file, "w") as bundle:
+        for idx, item in enumerate(items):
+            folder = f"{idx:03d}_{safe_name(item.question)}"
+            entry = {
+                "question": item.question,
+                "fun": item.fun,
+                "options": item.options or {},
+                "snapshot": item.snapshot,
+                "reference_snapshot": item.reference_snapshot,
+                "files": [],
+            }
+
+            for name in (item.snapshot, item.reference_snapshot):
+                if name:
+                    manifest["snapshots"][name] = get_snapshot_hash(name)
+
+            try:
+                for variant, frame in item.frames:
+                    buffer = io.BytesIO()
+                    arrow_safe(frame).to_parquet(
+                        buffer, index=False, compression=PARQUET_COMPRESSION
+                    )
+                    path = f"{folder}/{safe_name(variant)}.parquet"
+                    # Parquet pages are compressed already
+                    bundle.writestr(path, buffer.getvalue(), zipfile.ZIP_STORED)
+                    entry["files"].append(
+                        {"variant": variant, "path": path, "rows": len(frame)}
+                    )
+            except Exception as e:
+                entry["error"] = str(e)
+
+            if not entry["files"] and "error" not in entry:
+                entry["error"] = "No answer"
+            manifest["questions"].append(entry)
+
+        bundle.writestr(
+            "manifest.json",
+            json.dumps(manifest, indent=1, default=str),
+            zipfile.ZIP_DEFLATED,
+        )
+
+    return manifest
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pages.common.snapshots import derive_hash, get_snapshot_hash, register_snapshot
+
+FORK_SUFFIX = "_Fail"
+DEFAULT_MAX_FORKS = 8
+DEFAULT_FORK_TTL = 3600  # seconds
+
+
+def is_fork(name):
+    """
+    Returns True if a snapshot name was given by the fork registry.
+    """
+    return re.search(rf"{FORK_SUFFIX}_[0-9a-f]{{8}}$", name) is not None
+
+
+class ForkRegistry:
+    """
+    Keeps track of the failure snapshots forked on the Batfish server so that
+    a failure scenario is forked only once.
+
+    Forks are keyed by the content hash of the base snapshot and the sorted
+    failed nodes and interfaces. The least recently used forks, and forks not
+    used for `ttl` seconds, are deleted from the server. Leased forks are
+    never deleted while in use.
+    """
+
+    def __init__(self, create, delete, max_forks=DEFAULT_MAX_FORKS, ttl=None):
+        self._create = create  # create(base, name, nodes, interfaces)
+        self._delete = delete  # delete(name)
+        self.max_forks = max_forks
+        self.ttl = ttl
+        self._forks = OrderedDict()  # key -> [name, base, last_used, leases]
+        self._creating = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._forks)
+
+    def get_fork(self, base, failed_nodes=None, failed_interfaces=None, lease=False):
+        """
+        Returns the name of the fork of `base` with the failed components,
+        forking it on the server only if it does not exist already. A leased
+        fork must be given back with release().
+        """
+        nodes = sorted(failed_nodes or [], key=str)
+        interfaces = sorted(failed_interfaces or [], key=str)
+        base_hash = get_snapshot_hash(base)
+        key = (
+            base_hash or base,
+            tuple(str(n) for n in nodes),
+            tuple(str(i) for i in interfaces),
+        )
+        digest = derive_hash(*key)
+
+        # Only one thread forks a given scenario, the others wait for it
+        with self._lock:
+            key_lock = self._creating.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                with self._lock:
+                    entry = self._forks.get(key)
+                    if entry:
+                        entry[2] = time.monotonic()
+                        entry[3] += lease
+                        self._forks.move_to_end(key)
+
+                if not entry:
+                    name = f"{base}{FORK_SUFFIX}_{digest[:8]}"
+                    self._create(base, name, nodes, interfaces)
+                    if base_hash:
+                        register_snapshot(name, digest)
+                    entry = [name, base, time.monotonic(), int(lease)]
+                    with self._lock:
+                        self._forks[key] = entry
+        finally:
+            # Failed creations must not leave their lock behind
+            with self._lock:
+                self._creating.pop(key, None)
+
+        self.evict()
+        return entry[0]
+
+    def release(self, name):
+        with self._lock:
+            for entry in self._forks.values():
+                if entry[0] == name and entry[3]:
+                    entry[3] -= 1
+                    entry[2] = time.monotonic()
+                    break
+
+    @contextmanager
+    def lease(self, base, failed_nodes=None, failed_interfaces=None):
+        """
+        Context manager that keeps a fork on the server while it is used.
+        """
+        name = self.get_fork(base, failed_nodes, failed_interfaces, lease=True)
+        try:
+            yield name
+        finally:
+            self.release(name)
+
+    def evict(self):
+        """
+        Deletes expired and least recently used forks from the server.
+        """
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            idle = [k for k, entry in self._forks.items() if not entry[3]]
+            for key in idle:
+                if self.ttl and now - self._forks[key][2] > self.ttl:
+                    evicted.append(self._forks.pop(key)[0])
+
+            # Oldest idle forks go first
+            idle = [k for k, entry in self._forks.items() if not entry[3]]
+            excess = len(self._forks) - self.max_forks
+            for key in idle[: max(excess, 0)]:
+                evicted.append(self._forks.pop(key)[0])
+
+        for name in evicted:
+            self._delete(name)
+
+    def forget(self, name):
+        """
+        Removes a fork from the registry without deleting it, e.g. when it was
+        deleted from the server by other means.
+        """
+        with self._lock:
+            keys = [k for k, entry in self._forks.items() if entry[0] == name]
+            for key in keys:
+                del self._forks[key]
+
+    def drop_base(self, base):
+        """
+        Deletes all forks of a snapshot, e.g. when the snapshot is deleted.
+        """
+        with self._lock:
+            keys = [k for k, entry in self._forks.items() if entry[1] == base]
+            evicted = [self._forks.pop(k)[0] for k in keys]
+
+        for name in evicted:
+            self._delete(name)
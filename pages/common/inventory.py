@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+from pages.common.queries import get_interface_properties, get_node_properties
+from pages.common.snapshots import get_snapshot_hash
+
+MAX_INVENTORIES = 16
+
+NODE_PROPERTIES = "Configuration_Format|Device_Type|VRFs"
+INTERFACE_PROPERTIES = "VRF"
+
+# nodes and interfaces are sorted tuples, node_interfaces, vrfs and
+# device_types are read-only mappings keyed by node name
+Inventory = namedtuple(
+    "Inventory",
+    ["nodes", "interfaces", "node_interfaces", "vrfs", "device_types"],
+)
+
+_inventories = OrderedDict()  # snapshot hash -> Inventory
+_building = {}
+_lock = threading.Lock()
+
+
+def build_inventory(snapshot):
+    """
+    Builds the inventory of a snapshot from the nodeProperties and
+    interfaceProperties questions.
+    """
+    nodes_df = get_node_properties(snapshot, NODE_PROPERTIES)
+    infs_df = get_interface_properties(snapshot, INTERFACE_PROPERTIES)
+
+    type_column = (
+        "Device_Type" if "Device_Type" in nodes_df.columns else "Configuration_Format"
+    )
+    nodes = tuple(sorted(nodes_df["Node"]))
+    device_types = dict(zip(nodes_df["Node"], nodes_df[type_column].astype(str)))
+    vrfs = {
+        node: tuple(sorted(node_vrfs or []))
+        for node, node_vrfs in zip(nodes_df["Node"], nodes_df["VRFs"])
+    }
+
+    node_interfaces = {}
+    for interface in sorted(infs_df["Interface"], key=str):
+        node_interfaces.setdefault(interface.hostname, []).append(interface)
+
+    return Inventory(
+        nodes=nodes,
+        interfaces=tuple(i for node in nodes for i in node_interfaces.get(node, [])),
+        node_interfaces=MappingProxyType(
+            {node: tuple(infs) for node, infs in node_interfaces.items()}
+        ),
+        vrfs=MappingProxyType(vrfs),
+        device_types=MappingProxyType(device_types),
+    )
+
+
+def get_inventory(snapshot):
+    """
+    Returns the inventory of a snapshot. Inventories are shared by all pages
+    and sessions and are rebuilt only when the snapshot content changes.
+    """
+    digest = get_snapshot_hash(snapshot)
+    if not digest:
+        # Unknown content, nothing can be reused safely
+        return build_inventory(snapshot)
+
+    # Only one thread builds an inventory, the others wait for it
+    with _lock:
+        inventory = _inventories.get(digest)
+        if inventory:
+            _inventories.move_to_end(digest)
+            return inventory
+        build_lock = _building.setdefault(digest, threading.Lock())
+
+    with build_lock:
+        with _lock:
+            inventory = _inventories.get(digest)
+        if not inventory:
+            inventory = build_inventory(snapshot)
+            with _lock:
+                _inventories[digest] = inventory
+                while len(_inventories) > MAX_INVENTORIES:
+                    _inventories.popitem(last=False)
+
+    with _lock:
+        _building.pop(digest, None)
+
+    return inventory
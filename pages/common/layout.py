@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import networkx as nx
+
+DEFAULT_LARGE_GRAPH = 500
+MAX_LAYOUTS = 32
+MAX_POSITIONS = 50000
+LAYOUT_SEED = 7
+
+# Share of nodes with a known position above which a layout starts from the
+# previous positions instead of from scratch
+REUSE_RATIO = 0.5
+REUSE_ITERATIONS = 15
+
+_layouts = OrderedDict()  # graph hash -> positions
+_positions = {}  # node -> last known position
+_lock = threading.Lock()
+
+
+def get_large_graph():
+    """
+    Returns the number of nodes above which the cheaper layout is used.
+    """
+    return int(os.getenv("BATQ_LAYOUT_THRESHOLD") or DEFAULT_LARGE_GRAPH)
+
+
+def graph_hash(g):
+    """
+    Returns a hash of the nodes and (undirected) edges of a graph.
+    """
+    nodes = sorted(map(str, g.nodes()))
+    edges = sorted(sorted(map(str, edge)) for edge in g.edges())
+    return hashlib.sha256(json.dumps([nodes, edges]).encode()).hexdigest()
+
+
+def bfs_order(g):
+    """
+    Returns the nodes of a graph in breadth-first order, one connected
+    component after the other, so that neighbours stay close together.
+    """
+    order = []
+    seen = set()
+    for node in sorted(g.nodes(), key=str):
+        if node not in seen:
+            component = list(nx.bfs_tree(g, node))
+            seen.update(component)
+            order.extend(component)
+    return order
+
+
+def place_new_nodes(g, known):
+    """
+    Keeps the known positions and puts every new node at the centre of its
+    placed neighbours. Nodes without placed neighbours are put on a circle.
+    """
+    pos = dict(known)
+    pending = []
+    for node in bfs_order(g):
+        if node in pos:
+            continue
+        placed = [pos[n] for n in g.neighbors(node) if n in pos]
+        if placed:
+            pos[node] = sum(placed) / len(placed)
+        else:
+            pending.append(node)
+
+    if pending:
+        pos.update(nx.circular_layout(pending))
+    return pos
+
+
+def compute_layout(g, known=None):
+    """
+    Returns node positions of a graph. Known positions of the nodes (from a
+    previous layout) are reused when they cover most of the graph.
+    """
+    known = {n: p for n, p in (known or {}).items() if n in g}
+    reuse = len(g) and len(known) >= REUSE_RATIO * len(g)
+
+    if len(g) > get_large_graph():
+        # Force-directed layouts are too slow for large graphs
+        if reuse:
+            return place_new_nodes(g, known)
+        return nx.circular_layout(bfs_order(g))
+
+    if reuse:
+        return nx.spring_layout(
+            g,
+            pos=place_new_nodes(g, known),
+            iterations=REUSE_ITERATIONS,
+            seed=LAYOUT_SEED,
+        )
+    return nx.spring_layout(g, seed=LAYOUT_SEED)
+
+
+def get_layout(g):
+    """
+    Returns node positions of a graph. Layouts are cached by graph hash and
+    new layouts start from the positions of previously drawn nodes, so the
+    drawing stays stable between reruns and similar snapshots.
+    """
+    digest = graph_hash(g)
+    with _lock:
+        pos = _layouts.get(digest)
+        if pos is not None:
+            _layouts.move_to_end(digest)
+            return dict(pos)
+        known = {n: _positions[n] for n in g if n in _positions}
+
+    pos = compute_layout(g, known)
+
+    with _lock:
+        _layouts[digest] = pos
+        while len(_layouts) > MAX_LAYOUTS:
+            _layouts.popitem(last=False)
+
+        if len(_positions) + len(pos) > MAX_POSITIONS:
+            _positions.clear()
+        _positions.update(pos)
+
+    return dict(pos)
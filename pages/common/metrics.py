@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Timing of the questions by phase, kept for every user session and for the
+whole process, and exported in the Prometheus text format.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# cached: answer found in the answer cache (cache misses are not recorded)
+# build: construction of the question from its template and options
+# answer: the server answering, including the transfer of the answer and its
+#   conversion to a DataFrame by pybatfish
+# format: Bat-Q formatting of the answer
+# render: Streamlit serialization of the tables and figures
+PHASES = ("cached", "build", "answer", "format", "render")
+metric_columns = ["Question", "Phase", "Count", "Total", "Mean", "Max"]
+
+
+class Metrics:
+    """
+    Number of calls, total and maximum time (s) per question and phase.
+    """
+
+    def __init__(self):
+        self._stats = {}  # (question, phase) -> [count, total, max]
+        self._lock = threading.Lock()
+
+    def record(self, question, phase, seconds):
+        with self._lock:
+            stats = self._stats.setdefault((question, phase), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def rows(self):
+        """
+        Returns the statistics as rows with the metric_columns.
+        """
+        with self._lock:
+            items = sorted(
+                self._stats.items(),
+                key=lambda item: (item[0][0], PHASES.index(item[0][1])),
+            )
+        return [
+            [question, phase, count, total, total / count, peak]
+            for (question, phase), (count, total, peak) in items
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_process_metrics = Metrics()
+_session_metrics = contextvars.ContextVar("session_metrics", default=None)
+
+
+def get_metrics():
+    """
+    Returns the metrics of the process, i.e. of all sessions.
+    """
+    return _process_metrics
+
+
+def session_metrics():
+    """
+    Returns the metrics of the session bound to the current context, if any.
+    """
+    return _session_metrics.get()
+
+
+def bind_session(state):
+    """
+    Binds the metrics kept in a session state (e.g. st.session_state) to the
+    current context, so the timings recorded from now on are also added to
+    that session. Returns the session metrics.
+    """
+    if "metrics" not in state:
+        state["metrics"] = Metrics()
+    _session_metrics.set(state["metrics"])
+    return state["metrics"]
+
+
+def record(question, phase, seconds):
+    _process_metrics.record(question, phase, seconds)
+    metrics = _session_metrics.get()
+    if metrics is not None:
+        metrics.record(question, phase, seconds)
+
+
+@contextmanager
+def timed(question, phase):
+    """
+    Context manager that records the time spent in a phase of a question.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(question, phase, time.perf_counter() - start)
+
+
+def submit(executor, fn, *args):
+    """
+    Submits a task to an executor. The task runs in a copy of the current
+    context, so its timings are added to the session that submitted it.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _label(value):
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return value.replace("\n", "\\n")
+
+
+def to_prometheus(metrics=None):
+    """
+    Returns the metrics (of the process by default) in the Prometheus text
+    exposition format.
+    """
+    rows = (metrics or _process_metrics).rows()
+    lines = [
+        "# HELP batq_question_seconds Time spent on Batfish questions by phase.",
+        "# TYPE batq_question_seconds summary",
+    ]
+    for question, phase, count, total, _, _ in rows:
+        labels = f'question="{_label(question)}",phase="{phase}"'
+        lines.append(f"batq_question_seconds_count{{{labels}}} {count}")
+        lines.append(f"batq_question_seconds_sum{{{labels}}} {total:.6f}")
+
+    lines += [
+        "# HELP batq_question_seconds_max Longest time spent in a phase.",
+        "# TYPE batq_question_seconds_max gauge",
+    ]
+    for question, phase, _, _, _, peak in rows:
+        labels = f'question="{_label(question)}",phase="{phase}"'
+        lines.append(f"batq_question_seconds_max{{{labels}}} {peak:.6f}")
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_error = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port, host="localhost"):
+    """
+    Serves the process metrics at http://<host>:<port>/metrics. The server
+    is started only once per process. If it cannot be started (e.g. the port
+    is in use), the error is printed once and None is returned.
+    """
+    global _server, _server_error
+
+    with _server_lock:
+        if _server is None and _server_error is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                _server_error = e
+                print(f"Cannot serve the metrics on {host}:{port}: {e}")
+            else:
+                thread = threading.Thread(target=_server.serve_forever, daemon=True)
+                thread.start()
+        return _server
+
+
+def export_metrics():
+    """
+    Exports the process metrics to the file named by BATQ_METRICS_FILE and
+    serves them on the port set with BATQ_METRICS_PORT, if they are set. The
+    server listens on BATQ_METRICS_HOST (localhost by default).
+    """
+    path = os.getenv("BATQ_METRICS_FILE")
+    if path:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(to_prometheus())
+        os.replace(tmp_path, path)
+
+    port = os.getenv("BATQ_METRICS_PORT")
+    if port:
+        serve_metrics(int(port), os.getenv("BATQ_METRICS_HOST") or "localhost")
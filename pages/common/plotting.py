@@ -15,25 +15,72 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import json
+from collections import Counter
 import networkx as nx
 import matplotlib.pyplot as plt
+from pages.common.layout import get_large_graph, get_layout
 
 
-def get_topology(edges):
+def column_attr(column, name):
+    """
+    Returns an attribute (e.g. hostname) of every value in a frame column.
+    """
+    return [getattr(value, name, None) for value in column]
+
 
-    g = nx.Graph()
+def link_ends(u, v, local, remote):
+    """
+    Returns the (node, value) pairs of both ends of a link in a stable order,
+    so both directions of the link give the same pairs. Both ends are kept if
+    the link is a loop (u == v).
+    """
+    return tuple(sorted([(u, local), (v, remote)], key=str))
 
-    l3edges_json = json.loads(edges.to_json(orient="index"))
-    for k in l3edges_json:
-        neighbor = l3edges_json[k]
-        node_id = neighbor["Interface"]["hostname"]
-        remote_node_id = neighbor["Remote_Interface"]["hostname"]
-        g.add_edge(node_id, remote_node_id)
 
+def load_edges(sources, targets, ends, attrs):
+    """
+    Bulk loads edges into a multigraph. Each link is added once, even if it is
+    listed in both directions, using its sorted end points as the edge key.
+    Attributes that belong to one end of a link should therefore not depend
+    on the direction (see link_ends). The number of links between two nodes
+    is kept in the `multiplicity` attribute of their edges.
+    """
+    g = nx.MultiGraph()
+    g.add_edges_from(
+        (u, v, tuple(sorted(map(str, end))), data)
+        for u, v, end, data in zip(sources, targets, ends, attrs)
+    )
+
+    counts = Counter(frozenset((u, v)) for u, v in g.edges())
+    nx.set_edge_attributes(
+        g,
+        {(u, v, k): counts[frozenset((u, v))] for u, v, k in g.edges(keys=True)},
+        "multiplicity",
+    )
     return g
 
 
+def get_topology(edges):
+    interfaces = edges["Interface"]
+    remote_interfaces = edges["Remote_Interface"]
+
+    nodes = column_attr(interfaces, "hostname")
+    remote_nodes = column_attr(remote_interfaces, "hostname")
+    local_names = column_attr(interfaces, "interface")
+    remote_names = column_attr(remote_interfaces, "interface")
+    return load_edges(
+        nodes,
+        remote_nodes,
+        zip(map(str, interfaces), map(str, remote_interfaces)),
+        (
+            {"interfaces": link_ends(u, v, local, remote)}
+            for u, v, local, remote in zip(
+                nodes, remote_nodes, local_names, remote_names
+            )
+        ),
+    )
+
+
 # def get_figure(pframe):
 #     """
 #     Plots Pandas data frame
@@ -52,17 +99,24 @@ def get_topology(edges):
 
 
 def get_routing_topology(edges):
-
-    g = nx.Graph()
-
-    l3edges_json = json.loads(edges.to_json(orient="index"))
-    for k in l3edges_json:
-        neighbor = l3edges_json[k]
-        node_id = neighbor["Node"]
-        remote_node_id = neighbor["Remote_Node"]
-        g.add_edge(node_id, remote_node_id)
-
-    return g
+    nodes = edges["Node"].tolist()
+    remote_nodes = edges["Remote_Node"].tolist()
+
+    if "IP" in edges.columns and "Remote_IP" in edges.columns:
+        ips = edges["IP"].astype(str).tolist()
+        remote_ips = edges["Remote_IP"].astype(str).tolist()
+    else:
+        ips = remote_ips = [None] * len(nodes)
+
+    return load_edges(
+        nodes,
+        remote_nodes,
+        zip(zip(nodes, ips), zip(remote_nodes, remote_ips)),
+        (
+            {"ips": link_ends(u, v, ip, remote)}
+            for u, v, ip, remote in zip(nodes, remote_nodes, ips, remote_ips)
+        ),
+    )
 
 
 def plot_figure(g):
@@ -71,11 +125,14 @@ def plot_figure(g):
 
     """
 
-    # Calculate spring layout
-    pos = nx.spring_layout(g)
+    # Get cached or incremental layout
+    pos = get_layout(g)
 
     # Draw the graph using matplotlib within Streamlit
     fig, ax = plt.subplots()
-    nx.draw(g, pos, with_labels=True, ax=ax, node_size=1000, font_color="white")
+    if len(g) > get_large_graph():
+        nx.draw(g, pos, with_labels=False, ax=ax, node_size=10, width=0.2)
+    else:
+        nx.draw(g, pos, with_labels=True, ax=ax, node_size=1000, font_color="white")
 
     return fig
@@ -15,9 +15,13 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import streamlit as st
+import os
+import math
+import numpy as np
 import pandas as pd
-from pages.common.plotting import get_topology, get_routing_topology, plot_figure
+import streamlit as st
+from pandas.api.types import infer_dtype
+from pages.common.metrics import timed
 
 NO_DATA = """No data available!
 This usually means that the query is not applicable to the network.
@@ -36,25 +40,108 @@ topology_questions = ["layer3Edges", "userProvidedLayer1Edges"]
 
 default_frame_options = {"use_container_width": True, "hide_index": True}
 
+trace_questions = [
+    "traceroute",
+    "reachability",
+    "bidirectionalTraceroute",
+    "differentialReachability",
+]
 
-def format_result(result):
+trace_variants = [
+    "Traces",
+    "Forward_Traces",
+    "Reverse_Traces",
+    "Reference_Traces",
+    "Snapshot_Traces",
+    "Snapshot_Forward_Traces",
+    "Reference_Forward_Traces",
+    "Snapshot_Reverse_Traces",
+    "Reference_Reverse_Traces",
+]
+
+DEFAULT_PAGE_THRESHOLD = 5000
+page_sizes = [100, 500, 1000, 5000]
+
+step_columns = ["Node", "Type", "Action", "Detail"]
+trace_frame_columns = ["Row", "Variant", "Trace", "Disposition", *step_columns]
+trace_summary_columns = [
+    "ID",
+    "Row",
+    "Trace",
+    "Flow",
+    "Disposition",
+    "Final_Node",
+    "Hops",
+]
+DEFAULT_TRACE_TABS = 8
+
+filter_questions = [
+    "testFilters",
+    "searchFilters",
+    "findMatchingFilterLines",
+    "filterLineReachability",
+]
+
+# Flow fields of filter answers and their column types
+flow_fields = {
+    "ingressNode": "string",
+    "ingressInterface": "string",
+    "ingressVrf": "string",
+    "srcIp": "string",
+    "srcPort": "Int64",
+    "dstIp": "string",
+    "dstPort": "Int64",
+    "ipProtocol": "string",
+    "icmpVar": "Int64",
+    "icmpCode": "Int64",
+    "packetLength": "Int64",
+}
+vendor_structure_columns = {
+    "filename": "Trace_Filename",
+    "structureType": "Trace_Structure_Type",
+    "structureName": "Trace_Structure_Name",
+}
+filter_trace_columns = ["Trace_Text", *vendor_structure_columns.values()]
+
+
+# Applies to every cell of an object array
+is_empty_list = np.frompyfunc(lambda value: isinstance(value, list) and not value, 1, 1)
+
+
+def empty_mask(column):
     """
-    format Panadas dataframe to eliminate empty columns.
+    Returns a boolean mask of the empty cells (NaN, None, empty strings and
+    empty lists) of a column.
     """
-    # Replace empty lists with NaN values
-    for c in result.columns:
-        result[c] = result[c].apply(
-            lambda y: nan if isinstance(y, list) and len(y) == 0 else y
-        )
+    values = column.to_numpy()
+    mask = pd.isna(values)
+    if column.dtype == object:
+        mask |= values == ""
+        # Only columns with mixed values can hold lists (e.g. ListWrapper)
+        if infer_dtype(values, skipna=True).startswith("mixed"):
+            mask |= is_empty_list(values).astype(bool)
+    return mask
 
-    # Replace empty strings with NaN values
-    result = result.replace("", nan)
 
-    # Drop all empty columns
-    filtered_df = result.dropna(axis=1, how="all")
-    filtered_df = filtered_df.replace(nan, "")
+def format_result(result):
+    """
+    format Panadas dataframe to eliminate empty columns. The remaining empty
+    cells are replaced with empty strings.
+    """
+    columns = {}
+    removed = set()
+
+    for c in result.columns:
+        column = result[c]
+        empty = empty_mask(column)
+        if empty.all():
+            removed.add(c)
+        elif empty.any():
+            columns[c] = column.where(~empty, "")
+        else:
+            columns[c] = column
 
-    removed = set(result.columns) - set(filtered_df.columns)
+    filtered_df = pd.DataFrame(columns, index=result.index)
 
     return filtered_df, removed
 
@@ -116,22 +203,106 @@ def display_options(d):
 #     return traces_table
 
 
-def json_to_dataframe(trace):
-    traces_table = pd.DataFrame(columns=["Node", "Type", "Action", "Detail"])
+def step_details(step):
+    """
+    Returns the values of a step detail, one table row each.
+    """
+    detail = step.get("detail")
+    if isinstance(detail, dict):
+        return detail.values()
+    if isinstance(detail, list):
+        return detail
+    return [detail]
+
+
+def trace_steps(trace):
+    """
+    Yields (node, type, action, detail) for every step of a trace.
+    """
     for hop in trace["hops"]:
         node = hop["node"]["name"]
         for step in hop["steps"]:
-            new_trace = pd.DataFrame(
-                {
-                    "Node": node,
-                    "Type": step["type"],
-                    "Action": step["action"],
-                    "Detail": step["detail"],
-                }
+            for detail in step_details(step):
+                yield node, step["type"], step["action"], detail
+
+
+def json_to_dataframe(trace):
+    return pd.DataFrame.from_records(list(trace_steps(trace)), columns=step_columns)
+
+
+def flatten_traces(rows, variants=None):
+    """
+    Flattens all traces of an answer into one table with a row per trace step.
+
+    The table is keyed by answer row, trace column (Variant, e.g. Forward_Traces)
+    and trace index. Traces without steps are kept as a single empty step.
+    """
+    variants = variants or trace_variants
+    records = []
+
+    for row_idx, row in enumerate(rows):
+        for variant in variants:
+            for trace_idx, trace in enumerate(row.get(variant) or []):
+                key = (row_idx, variant, trace_idx, trace["disposition"])
+                count = len(records)
+                records.extend((*key, *step) for step in trace_steps(trace))
+                if len(records) == count:
+                    records.append((*key, None, None, None, None))
+
+    return pd.DataFrame.from_records(records, columns=trace_frame_columns)
+
+
+def flow_text(flow):
+    """
+    Returns a short description of a flow.
+    """
+    if not isinstance(flow, dict):
+        return str(flow or "")
+
+    dst = flow.get("dstIp", "")
+    if flow.get("dstPort"):
+        dst = f"{dst}:{flow['dstPort']}"
+    parts = [
+        flow.get("ingressNode"),
+        flow.get("srcIp"),
+        "->",
+        dst,
+        flow.get("ipProtocol"),
+    ]
+    return " ".join(str(p) for p in parts if p)
+
+
+def summarize_traces(rows, variant):
+    """
+    Returns a table with a row per trace of a trace column: the flow, the
+    disposition, the final node and the number of hops. The trace steps are
+    not read, so this is cheap even for answers with many traces.
+    """
+    # e.g. Snapshot_Forward_Traces -> Forward_Flow
+    flow_column = next(
+        (f"{d}_Flow" for d in ["Forward", "Reverse"] if d in variant), "Flow"
+    )
+    records = []
+
+    for row_idx, row in enumerate(rows):
+        traces = row.get(variant) or []
+        flow = flow_text(row.get(flow_column)) if traces else ""
+        for trace_idx, trace in enumerate(traces):
+            hops = trace.get("hops") or []
+            final_node = hops[-1]["node"]["name"] if hops else None
+            records.append(
+                (
+                    len(records) + 1,
+                    row_idx,
+                    trace_idx,
+                    flow,
+                    trace["disposition"],
+                    final_node,
+                    len(hops),
+                )
             )
-            traces_table = pd.concat([traces_table, new_trace], ignore_index=True)
 
-    return traces_table
+    return pd.DataFrame.from_records(records, columns=trace_summary_columns)
 
 
 def filter_frame(df):
@@ -164,30 +335,133 @@ def filter_frame(df):
     return filtered_df
 
 
-def display_trace(answer_row):
+def display_trace(traces):
     """
-    Displays traces of rechability and traceroute questions.
+    Displays traces of rechability and traceroute questions. The traces are
+    a slice of the table returned by flatten_traces.
     """
 
-    count = len(answer_row)
-    if count > 1:
-        tabs = st.tabs([f"Trace {idx+1}" for idx in range(count)])
-        for idx, tab in enumerate(tabs):
-            with tab:
-                trace = answer_row[idx]
-                st.write(f"**Disposition:** {trace['disposition']}")
-                fr = json_to_dataframe(trace)
-                st.dataframe(fr, **default_frame_options)
+    groups = list(traces.groupby(["Row", "Trace"], sort=True))
+    if not groups:
+        st.write("No traces.")
+        return
+
+    if len(groups) > 1:
+        tabs = st.tabs([f"Trace {idx + 1}" for idx in range(len(groups))])
     else:
-        st.write(f"**Disposition:** {answer_row[0]['disposition']}")
-        fr = json_to_dataframe(answer_row[0])
-        st.dataframe(fr, **default_frame_options)
+        tabs = [st.container()]
+
+    for tab, (_, trace) in zip(tabs, groups):
+        with tab:
+            st.write(f"**Disposition:** {trace['Disposition'].iloc[0]}")
+            fr = trace[step_columns].dropna(how="all")
+            st.dataframe(fr, **default_frame_options)
+
+
+def display_traces(question, rows, variant, key):
+    """
+    Displays the traces of a trace column of an answer. A few traces are
+    shown in tabs. Otherwise the traces are counted by disposition, final
+    node and hop count, and only the selected trace is built.
+    """
+    with timed(question, "format"):
+        summary = summarize_traces(rows, variant)
+
+    if len(summary) <= DEFAULT_TRACE_TABS:
+        with timed(question, "format"):
+            traces = flatten_traces(rows, [variant])
+        with timed(question, "render"):
+            display_trace(traces)
+        return
+
+    with timed(question, "format"):
+        counts = (
+            summary.groupby(["Disposition", "Final_Node", "Hops"], dropna=False)
+            .size()
+            .reset_index(name="Traces")
+        )
+
+    with timed(question, "render"):
+        st.markdown(f"**{len(summary)} traces:**")
+        st.dataframe(counts, **default_frame_options)
+
+        col1, col2 = st.columns(2)
+        dispositions = sorted(summary["Disposition"].unique())
+        disposition = col1.selectbox(
+            "Disposition", ["All", *dispositions], key=f"{key}_disposition"
+        )
+        selected = (
+            summary
+            if disposition == "All"
+            else summary[summary["Disposition"] == disposition]
+        )
+        with st.expander(f"Traces ({len(selected)})", expanded=False):
+            display_frame(selected, f"{key}_traces")
+
+        trace_id = col2.number_input(
+            "Show trace (ID)", 1, len(summary), 1, key=f"{key}_trace"
+        )
+        trace = summary.iloc[trace_id - 1]
+        st.markdown(
+            f"**Flow:** {trace['Flow']}  \n**Disposition:** {trace['Disposition']}"
+        )
+        steps = json_to_dataframe(rows[trace["Row"]][variant][trace["Trace"]])
+        st.dataframe(steps, **default_frame_options)
 
 
-def display_result(question, answer):
+def get_page_threshold():
+    """
+    Returns the number of rows above which tables are paged.
+    """
+    return int(os.getenv("BATQ_PAGE_THRESHOLD") or DEFAULT_PAGE_THRESHOLD)
+
+
+def sort_index(column, ascending=True):
+    """
+    Returns the index of a column sorted by value. Columns that hold values
+    which cannot be compared (e.g. lists) are sorted by their text.
+    """
+    try:
+        return column.sort_values(ascending=ascending, kind="stable").index
+    except TypeError:
+        return column.astype(str).sort_values(ascending=ascending, kind="stable").index
+
+
+def display_frame(df, key):
+    """
+    Displays a table. Tables longer than the page threshold stay on the server
+    and are sorted and paged there, so only the visible rows are sent to the
+    browser.
+    """
+    if len(df) <= get_page_threshold():
+        st.dataframe(df, **default_frame_options)
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    sort_by = col1.selectbox("Sort by", [None, *df.columns], key=f"{key}_sort")
+    order = col2.selectbox("Order", ["Ascending", "Descending"], key=f"{key}_order")
+    page_size = col3.selectbox("Rows per page", page_sizes, index=2, key=f"{key}_size")
+    pages = math.ceil(len(df) / page_size)
+    page = col4.number_input(f"Page (of {pages})", 1, pages, 1, key=f"{key}_page")
+
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(df))
+    if sort_by is None:
+        window = df.iloc[start:end]
+    else:
+        index = sort_index(df[sort_by], ascending=order == "Ascending")
+        window = df.loc[index[start:end]]
+
+    st.dataframe(window, **default_frame_options)
+    st.caption(f"Rows {start + 1} to {end} of {len(df)}.")
+
+
+def display_result(question, answer, key=None):
     """
     Dispaly answers to questions. The formatting depends on question type.
+    The key identifies the answer's widgets and must be unique on the page.
     """
+    key = key or question
 
     if not answer:
         st.write("The answer set is empty.")
@@ -196,7 +470,7 @@ def display_result(question, answer):
     try:
         if question in ["traceroute", "reachability"]:
             st.write(f"**Trace status:** {answer['status']}")
-            display_trace(answer.rows[0]["Traces"])
+            display_traces(question, answer.rows, "Traces", f"{key}_traces")
 
         elif question == "bidirectionalTraceroute":
             st.write(f"**Trace status:** {answer['status']}")
@@ -205,29 +479,44 @@ def display_result(question, answer):
             )
 
             st.markdown("**Forward Trace(s):**")
-            display_trace(answer.rows[0]["Forward_Traces"])
+            display_traces(question, answer.rows, "Forward_Traces", f"{key}_forward")
 
             st.write(
                 "**Reverse Flow:**  \n" + dict_to_str(answer.rows[0]["Reverse_Flow"])
             )
 
             st.markdown("**Reverse Trace(s):**")
-            display_trace(answer.rows[0]["Reverse_Traces"])
+            display_traces(question, answer.rows, "Reverse_Traces", f"{key}_reverse")
 
-        elif question == "testFilters":
+        elif question in filter_questions:
+            with timed(question, "format"):
+                filtered_df, removed = format_result_lite(
+                    flatten_filter_answer(answer.frame(), answer.rows)
+                )
 
-            flattened = flatten_trace_data(answer.rows)
-            st.dataframe(flattened)
+            if filtered_df.empty:
+                st.warning(NO_DATA)
+            else:
+                with timed(question, "render"):
+                    display_frame(filtered_df, key)
+
+            if removed:
+                removed_str = ", ".join(list(removed))
+                st.markdown(
+                    f"The query returned these empty columns:  \n{removed_str}."
+                )
 
         elif question in select_questions:
-            filtered_df, removed = format_result(answer.frame())
+            with timed(question, "format"):
+                filtered_df, removed = format_result(answer.frame())
 
             # filtered_df = filter_frame(df)
             # Print the result
             if filtered_df.empty:
                 st.warning(NO_DATA)
             else:
-                st.dataframe(filtered_df, **default_frame_options)
+                with timed(question, "render"):
+                    display_frame(filtered_df, key)
                 # filter_frame(filtered_df)
 
             # Print removed columns
@@ -238,12 +527,14 @@ def display_result(question, answer):
                 )
         else:  # all other questions:
             # st.dataframe(answer.frame())
-            filtered_df, removed = format_result_lite(answer.frame())
+            with timed(question, "format"):
+                filtered_df, removed = format_result_lite(answer.frame())
             # Print the result
             if filtered_df.empty:
                 st.warning(NO_DATA)
             else:
-                st.dataframe(filtered_df, **default_frame_options)
+                with timed(question, "render"):
+                    display_frame(filtered_df, key)
                 # filter_frame(filtered_df)
 
             # Print removed columns
@@ -253,16 +544,22 @@ def display_result(question, answer):
                     f"The query returned these empty columns:  \n{removed_str}."
                 )
 
-        # Plot some answers
+        # Plot some answers (the plotting libraries are loaded only here)
         if question in topology_questions:
+            from pages.common.plotting import get_topology, plot_figure
+
             _, col, _ = st.columns([1, 2, 1])
-            fig = plot_figure(get_topology(answer.frame()))
-            col.pyplot(fig)
+            with timed(question, "render"):
+                fig = plot_figure(get_topology(frame))
+                col.pyplot(fig)
 
         elif question == "bgpEdges":
+            from pages.common.plotting import get_routing_topology, plot_figure
+
             _, col, _ = st.columns([1, 2, 1])
-            fig = plot_figure(get_routing_topology(answer.frame()))
-            col.pyplot(fig)
+            with timed(question, "render"):
+                fig = plot_figure(get_routing_topology(frame))
+                col.pyplot(fig)
 
     except Exception as e:
         st.error(f"Unable to display formatted answer. Error: {e}")
@@ -270,47 +567,55 @@ def display_result(question, answer):
         st.write(answer)
 
 
-def display_result_diff(question, answer):
+def display_result_diff(question, answer, key=None):
     """
     Dispaly answers to differential questions. The formatting depends on
     question type.
     """
 
+    key = key or question
+
     try:
         if question in ["traceroute", "differentialReachability"]:
             st.markdown("**Reference Trace:**")
             st.write(f"**Trace status:** {answer['status']}")
             if answer.rows:
-                display_trace(answer.rows[0]["Reference_Traces"])
+                display_traces(
+                    question, answer.rows, "Reference_Traces", f"{key}_reference"
+                )
 
             st.markdown("**Snapshot Trace:**")
             st.write(f"**Trace status:** {answer['status']}")
             if answer.rows:
-                display_trace(answer.rows[0]["Snapshot_Traces"])
+                display_traces(
+                    question, answer.rows, "Snapshot_Traces", f"{key}_snapshot"
+                )
 
         elif question == "bidirectionalTraceroute":
             st.markdown(
                 "**Forward Flow:**  \n" + dict_to_str(answer.rows[0]["Forward_Flow"])
             )
 
-            st.markdown("**Snapshot Forward Trace:**")
-            display_trace(answer.rows[0]["Snapshot_Forward_Traces"])
-
-            st.markdown("**Reference Forward Trace:**")
-            display_trace(answer.rows[0]["Reference_Forward_Traces"])
+            for title, variant in [
+                ("Snapshot Forward Trace", "Snapshot_Forward_Traces"),
+                ("Reference Forward Trace", "Reference_Forward_Traces"),
+            ]:
+                st.markdown(f"**{title}:**")
+                display_traces(question, answer.rows, variant, f"{key}_{variant}")
 
             st.write(
                 "**Reverse Flow:**  \n" + dict_to_str(answer.rows[0]["Reverse_Flow"])
             )
 
-            st.markdown("**Snapshot Reverse Trace:**")
-            display_trace(answer.rows[0]["Snapshot_Reverse_Traces"])
-
-            st.markdown("**Reference Reverse Trace:**")
-            display_trace(answer.rows[0]["Reference_Reverse_Traces"])
+            for title, variant in [
+                ("Snapshot Reverse Trace", "Snapshot_Reverse_Traces"),
+                ("Reference Reverse Trace", "Reference_Reverse_Traces"),
+            ]:
+                st.markdown(f"**{title}:**")
+                display_traces(question, answer.rows, variant, f"{key}_{variant}")
 
         else:
-            display_result(question, answer)
+            display_result(question, answer, key)
 
     except Exception as e:
         st.error(f"Unable to display formatted answer. Error: {e}")
@@ -318,58 +623,172 @@ def display_result_diff(question, answer):
         st.write(answer)
 
 
-def flatten_trace_data(data):
+def display_local_diff(question, reference_answer, snapshot_answer, key=None):
     """
-    Flattens the `Trace` list in a given data structure while retaining the rest of the dictionary intact.
-
-    Args:
-        data (list): List of dictionaries containing node, flow, and trace information.
-
-    Returns:
-        list: Flattened list of dictionaries with trace details extracted.
+    Displays the differences between the answers to a question for two
+    snapshots, computed by Bat-Q instead of the Batfish server.
     """
-    flattened_data = []
+    from pages.common.differ import diff_answers
 
-    for item in data:
-        # Common fields that are preserved
-        common_fields = {
-            "Node": item.get("Node"),
-            "Filter_Name": item.get("Filter_Name"),
-            "Flow": item.get("Flow"),
-            "Action": item.get("Action"),
-            "Line_Content": item.get("Line_Content"),
-        }
+    key = key or question
+    if not reference_answer or not snapshot_answer:
+        st.write("The answer set is empty.")
+        return
 
-        # If Trace is empty, add the common fields directly
-        if not item.get("Trace"):
-            flattened_data.append(
-                {**common_fields, "Trace_Text": None, "Trace_Vendor_Structure": None}
+    try:
+        with timed(question, "format"):
+            added, removed, changed = diff_answers(
+                question, reference_answer, snapshot_answer
             )
-            continue
+        if added.empty and removed.empty and changed.empty:
+            st.write("The answers are the same for both snapshots.")
+            return
+
+        for title, df, part in [
+            ("Only in Snapshot", added, "added"),
+            ("Only in Reference", removed, "removed"),
+            ("Changed", changed, "changed"),
+        ]:
+            st.markdown(f"**{title}:** {len(df)} rows")
+            if not df.empty:
+                with timed(question, "render"):
+                    display_frame(df, f"{key}_{part}")
+
+    except Exception as e:
+        st.error(f"Unable to compare the answers. Error: {e}")
 
-        # Process each trace entry
-        for trace in item.get("Trace", []):
-            trace_element = trace.get("traceElement", {})
-            fragments = trace_element.get("fragments", [])
 
-            # Flatten trace fragments into text and vendor structure details
-            trace_text = " ".join(f.get("text", "") for f in fragments if f.get("text"))
-            vendor_structure = next(
-                (
-                    f.get("vendorStructureId")
-                    for f in fragments
-                    if "vendorStructureId" in f
-                ),
+def trace_tree_text(tree):
+    """
+    Returns the text of a filter trace tree, with its children in depth-first
+    order, and the first vendor structure (e.g. the ACL line) it points to.
+    """
+    texts = []
+    structure = None
+    stack = [tree]
+
+    while stack:
+        node = stack.pop()
+        fragments = (node.get("traceElement") or {}).get("fragments") or []
+        text = "".join(f.get("text") or "" for f in fragments).strip()
+        if text:
+            texts.append(text)
+        if structure is None:
+            structure = next(
+                (f["vendorStructureId"] for f in fragments if "vendorStructureId" in f),
                 None,
             )
+        stack.extend(reversed(node.get("children") or []))
 
-            # Append the flattened result
-            flattened_data.append(
-                {
-                    **common_fields,
-                    "Trace_Text": trace_text,
-                    "Trace_Vendor_Structure": vendor_structure,
-                }
-            )
+    return "; ".join(texts), structure or {}
 
-    return flattened_data
+
+def flatten_filter_answer(frame, rows):
+    """
+    Flattens a filter-analysis answer, given as its frame (answer.frame())
+    and raw rows (answer.rows), in a single pass over the rows:
+
+    - the flow becomes Flow_<field> columns of string or integer type,
+    - every trace tree becomes a row with its text and the file, type and
+      name of the vendor structure it matched.
+
+    The other columns are taken from the frame, as parsed by pybatfish.
+    Flow and trace columns that are empty for all rows are left out.
+    """
+    has_flow = "Flow" in frame.columns
+    has_trace = "Trace" in frame.columns
+    flows = {f: [] for f in flow_fields} if has_flow else {}
+    traces = {c: [] for c in filter_trace_columns} if has_trace else {}
+    repeats = []
+
+    for row in rows:
+        flow = row.get("Flow") or {}
+        trees = (row.get("Trace") or [None]) if has_trace else [None]
+        repeats.append(len(trees))
+
+        for tree in trees:
+            for f, values in flows.items():
+                values.append(flow.get(f))
+            if has_trace:
+                text, structure = trace_tree_text(tree) if tree else (None, {})
+                traces["Trace_Text"].append(text)
+                for key, column in vendor_structure_columns.items():
+                    traces[column].append(structure.get(key))
+
+    # A frame row per trace tree
+    plain = frame.drop(columns=["Flow", "Trace"], errors="ignore")
+    df = plain.iloc[np.repeat(np.arange(len(plain)), repeats)].reset_index(drop=True)
+
+    for f, values in flows.items():
+        column = pd.Series(values, dtype=flow_fields[f])
+        if not column.isna().all():
+            df[f"Flow_{f}"] = column
+    for c, values in traces.items():
+        column = pd.Series(values, dtype="string")
+        if not column.isna().all():
+            df[c] = column
+
+    return df
+
+
+def display_metrics():
+    """
+    Shows the time spent on each question by phase, for this session and for
+    all sessions, in the sidebar and exports the metrics.
+    """
+    from pages.common.metrics import (
+        export_metrics,
+        get_metrics,
+        metric_columns,
+        session_metrics,
+    )
+
+    with st.sidebar.expander("Timing", expanded=False):
+        for title, metrics in [
+            ("This session", session_metrics()),
+            ("All sessions", get_metrics()),
+        ]:
+            st.markdown(f"**{title}:**")
+            rows = metrics.rows() if metrics else []
+            if rows:
+                df = pd.DataFrame(rows, columns=metric_columns)
+                st.dataframe(df.round(4), **default_frame_options)
+            else:
+                st.write("No questions were asked.")
+
+    export_metrics()
+
+
+def display_export(items, key, description=""):
+    """
+    Shows a sidebar button that exports the answers on the page to a zip
+    bundle of Parquet files. The bundle is written to a temporary file, one
+    table at a time, and offered until the questions, their options or the
+    snapshots on the page change. Old bundles are deleted by new_bundle_path.
+    """
+    from pages.common.export import items_signature, new_bundle_path, write_bundle
+
+    items = list(items)
+    signature = items_signature(items)
+    state_key = f"export_{key}"
+    export = st.session_state.get(state_key)
+
+    if st.sidebar.button("Export Answers", key=f"{state_key}_button"):
+        if export and os.path.exists(export["path"]):
+            os.remove(export["path"])
+        path = new_bundle_path()
+        with st.spinner("Writing the answers..."):
+            write_bundle(path, items, description)
+        export = {"signature": signature, "path": path}
+        st.session_state[state_key] = export
+
+    current = export and export["signature"] == signature
+    if current and os.path.exists(export["path"]):
+        with open(export["path"], "rb") as f:
+            st.sidebar.download_button(
+                label="Download Answers",
+                data=f,
+                file_name=f"{key}_answers.zip",
+                mime="application/zip",
+                help="Parquet file per question and variant, with a manifest.",
+            )
@@ -16,32 +16,148 @@ limitations under the License.
 """
 
 # import ast
-from pybatfish.question import bfq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # from pybatfish.datamodel import PathConstraints, HeaderConstraints
-from pybatfish.client.commands import bf_set_snapshot, bf_fork_snapshot
+from pages.common.backend import get_backend
+from pages.common.cache import get_cache, make_key
+from pages.common.snapshots import (
+    find_snapshot,
+    forget_snapshot,
+    get_snapshot_hash,
+    hash_stream,
+    register_snapshot,
+)
+from pages.common.forks import (
+    DEFAULT_FORK_TTL,
+    DEFAULT_MAX_FORKS,
+    ForkRegistry,
+    is_fork,
+)
+from pages.common.catalog import get_catalog, plan_retention
+from pages.common.metrics import record, submit
 
+DEFAULT_WORKERS = 4
 
-def get_node_properties():
-    return bfq.nodeProperties().answer().frame()["Node"]
 
+def get_node_properties(snapshot, properties=None):
+    qargs = {"properties": properties} if properties else {}
+    return get_backend().answer("nodeProperties", qargs, snapshot).frame()
 
-def get_interface_properties():
-    return bfq.interfaceProperties().answer().frame()["Interface"]
 
+def get_interface_properties(snapshot, properties=None):
+    qargs = {"properties": properties} if properties else {}
+    return get_backend().answer("interfaceProperties", qargs, snapshot).frame()
 
-def set_snapshot(active_snapshot):
-    return bf_set_snapshot(active_snapshot)
+
+def ingest_snapshot(upload, name):
+    """
+    Uploads a snapshot (a zip file object) unless a snapshot with the same
+    content is already on the server.
+
+    Returns the name of the snapshot and whether it was initialized.
+    """
+    digest = hash_stream(upload)
+    existing = find_snapshot(digest)
+    size = upload.seek(0, os.SEEK_END)
+    upload.seek(0)
+
+    backend = get_backend()
+    if existing and existing in backend.list_snapshots():
+        return existing, False
+    backend.init_snapshot(upload, name)
+    devices, status = parse_summary(name)
+
+    register_snapshot(name, digest)
+    get_catalog().add(name, digest, size, devices, status)
+    return name, True
+
+
+def parse_summary(snapshot):
+    """
+    Returns the number of devices of a snapshot and its parse status, which
+    lists the file statuses other than PASSED.
+    """
+    try:
+        frame = get_backend().answer("fileParseStatus", None, snapshot).frame()
+    except Exception as e:
+        print(e)
+        return None, "UNKNOWN"
+
+    devices = len({node for nodes in frame["Nodes"] for node in nodes or []})
+    failed = sorted(set(frame["Status"]) - {"PASSED"})
+    return devices, ", ".join(failed) or "PASSED"
+
+
+def attach_snapshots():
+    """
+    Re-attaches the cataloged snapshots that are still on the server, so they
+    are not uploaded and parsed again after a restart, and applies the
+    retention policy.
+
+    Forks left by a previous run are deleted. Other snapshots unknown to the
+    catalog are kept, unless BATQ_PURGE_UNKNOWN is set.
+    """
+    catalog = get_catalog()
+    server_snapshots = get_backend().list_snapshots()
+
+    keep, expired = plan_retention(catalog.entries(), server_snapshots)
+    attached = {entry["name"] for entry in keep}
+    purge_unknown = os.getenv("BATQ_PURGE_UNKNOWN")
+
+    for name in server_snapshots:
+        if name in expired or (
+            name not in attached and (purge_unknown or is_fork(name))
+        ):
+            delete_snapshot(name)
+
+    for entry in catalog.entries():
+        if entry["name"] not in attached:
+            catalog.remove(entry["name"])
+
+    for entry in keep:
+        register_snapshot(entry["name"], entry["hash"])
+
+    return sorted(attached)
+
+
+def get_question_funs():
+    """
+    Returns the names of the question templates loaded from the server.
+    """
+    return get_backend().list_questions()
+
+
+def _fork_on_server(base, name, failed_nodes, failed_interfaces):
+    get_backend().fork_snapshot(base, name, failed_nodes, failed_interfaces)
+
+
+def delete_snapshot(snapshot):
+    try:
+        get_backend().delete_snapshot(snapshot)
+    except Exception as e:
+        print(e)
+    forget_snapshot(snapshot)
+    get_catalog().remove(snapshot)
+    fork_registry.forget(snapshot)
+
+
+fork_registry = ForkRegistry(
+    _fork_on_server,
+    delete_snapshot,
+    max_forks=int(os.getenv("BATQ_MAX_FORKS") or DEFAULT_MAX_FORKS),
+    ttl=float(os.getenv("BATQ_FORK_TTL") or DEFAULT_FORK_TTL),
+)
 
 
 def fork_snapshot(active_snapshot, failed_nodes=None, failed_interfaces=None):
-    bf_fork_snapshot(
-        active_snapshot,
-        active_snapshot + "_Fail",
-        deactivate_nodes=failed_nodes,
-        deactivate_interfaces=failed_interfaces,
-        overwrite=True,
-    )
+    """
+    Returns the name of a snapshot forked from the active snapshot with the
+    failed components deactivated. Forks are reused for the same failures.
+    """
+    return fork_registry.get_fork(active_snapshot, failed_nodes, failed_interfaces)
 
 
 # def get_params(param_list):
@@ -71,34 +187,103 @@ def fork_snapshot(active_snapshot, failed_nodes=None, failed_interfaces=None):
 #     return qargs
 
 
-def run_query(question, snapshots=None):
+def answer_key(question, snapshots):
     """
-    Run Batfish question and get an answer.
+    Returns the cache key of a question or None if the content of any of the
+    snapshots is unknown.
+    """
+    hashes = [get_snapshot_hash(name) for name in snapshots]
+    if not all(hashes):
+        return None
+    return make_key(hashes, question["fun"], question.get("options"))
+
+
+def run_query(question, snapshots=None, snapshot=None):
+    """
+    Run Batfish question against a snapshot (or a pair of snapshots for
+    comparisons) and get an answer. Answers are cached by snapshot content,
+    so repeated questions are not sent to the server again.
     """
 
     answer = None
     question_fun = question["fun"]
+    key = answer_key(question, snapshots or (snapshot,))
+    cache = get_cache()
+
+    if key:
+        start = time.perf_counter()
+        answer = cache.get(key)
+        if answer is not None:
+            # Only hits are recorded, misses are timed by the other phases
+            record(question_fun, "cached", time.perf_counter() - start)
+            return answer
+
     try:
-        # Run query
-        fun = getattr(bfq, question_fun)
-        qargs = question.get("options")
+        qargs = question.get("options") or {}
 
         if snapshots:  # for comparisions
-            if qargs:
-                answer = fun(**qargs).answer(
-                    snapshot=snapshots[1], reference_snapshot=snapshots[0]
-                )
-            else:
-                answer = fun().answer(
-                    snapshot=snapshots[1], reference_snapshot=snapshots[0]
-                )
-        else:  # for active snapshot
-            if qargs:
-                answer = fun(**qargs).answer()
-            else:
-                answer = fun().answer()
+            answer = get_backend().answer(
+                question_fun, qargs, snapshots[1], reference_snapshot=snapshots[0]
+            )
+        else:  # for the given snapshot
+            answer = get_backend().answer(question_fun, qargs, snapshot)
+
+        if key:
+            cache.put(key, answer)
 
     except Exception as e:
         print(e)
     finally:
         return answer
+
+
+def get_max_workers():
+    """
+    Returns the number of questions sent to Batfish at the same time.
+    """
+    return int(os.getenv("BATQ_WORKERS") or DEFAULT_WORKERS)
+
+
+def run_queries(questions, snapshots=None, snapshot=None, max_workers=None):
+    """
+    Run a list of Batfish questions using a bounded pool of workers.
+
+    Yields (index, answer) pairs in the order the answers arrive, where index
+    is the position of the question in the list.
+    """
+    workers = max(1, min(max_workers or get_max_workers(), len(questions)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            submit(executor, run_query, question, snapshots, snapshot): idx
+            for idx, question in enumerate(questions)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_query_matrix(questions, snapshots, max_workers=None):
+    """
+    Run a list of Batfish questions against several snapshots using a bounded
+    pool of workers. Each question is asked once per snapshot.
+
+    Yields (snapshot, index, answer) in the order the answers arrive.
+    """
+    jobs = [(s, idx) for s in snapshots for idx in range(len(questions))]
+    workers = max(1, min(max_workers or get_max_workers(), len(jobs)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            submit(executor, run_query, questions[idx], None, s): (s, idx)
+            for s, idx in jobs
+        }
+        for future in as_completed(futures):
+            yield (*futures[future], future.result())
+
+
+def list_snapshots(forks=False):
+    """
+    Returns the snapshots on the server, without the failure forks unless
+    forks is set.
+    """
+    return [s for s in get_backend().list_snapshots() if forks or not is_fork(s)]
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from pages.common.questions import read_questions
+
+InputField = namedtuple("InputField", ["name", "type", "mandatory"])
+Question = namedtuple(
+    "Question", ["name", "fun", "category", "inputs", "differential", "available"]
+)
+Category = namedtuple("Category", ["name", "description", "questions"])
+
+
+def parse_input(data):
+    """
+    Returns the schema of a question input. Inputs are given as dicts or,
+    for a few questions, just by name.
+    """
+    if isinstance(data, str):
+        return InputField(data, None, False)
+    return InputField(
+        data["name"], data.get("type"), not data.get("optional", True)
+    )
+
+
+class QuestionRegistry:
+    """
+    Read-only index of the Batfish questions known to Bat-Q, by name, by
+    function and by category.
+    """
+
+    def __init__(self, catalog, available=None):
+        questions = {}
+        categories = []
+
+        for cat in catalog:
+            names = []
+            for q in cat["questions"]:
+                questions[q["name"]] = Question(
+                    name=q["name"],
+                    fun=q["fun"],
+                    category=cat["category"],
+                    inputs=tuple(parse_input(i) for i in q.get("input") or []),
+                    differential=q.get("type") == "differential",
+                    available=available is None or q["fun"] in available,
+                )
+                names.append(q["name"])
+            categories.append(
+                Category(cat["category"], cat.get("description"), tuple(names))
+            )
+
+        self._catalog = catalog
+        self.questions = MappingProxyType(questions)
+        self.funs = MappingProxyType({q.fun: q for q in questions.values()})
+        self.categories = tuple(categories)
+
+    def __contains__(self, name):
+        return name in self.questions
+
+    def get(self, name):
+        return self.questions.get(name)
+
+    def by_fun(self, fun):
+        return self.funs.get(fun)
+
+    def by_category(self, category):
+        for cat in self.categories:
+            if cat.name == category:
+                return tuple(self.questions[name] for name in cat.questions)
+        return ()
+
+    def missing_inputs(self, fun, options=None):
+        """
+        Returns the names of the mandatory inputs of a question that are not
+        given in the options.
+        """
+        question = self.by_fun(fun)
+        if not question:
+            return []
+        options = options or {}
+        return [
+            field.name
+            for field in question.inputs
+            if field.mandatory and options.get(field.name) in (None, "")
+        ]
+
+    def refreshed(self, server_funs):
+        """
+        Returns a registry that marks the questions the server does not
+        provide as unavailable.
+        """
+        return QuestionRegistry(self._catalog, set(server_funs))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the question registry, built once per process.
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = QuestionRegistry(read_questions()["Batfish"])
+        return _registry
+
+
+def refresh_registry(server_funs):
+    """
+    Updates the registry with the question templates of the server.
+    """
+    global _registry
+
+    registry = get_registry().refreshed(server_funs)
+    with _registry_lock:
+        _registry = registry
+    return registry
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+DEFAULT_NETWORK = "NETWORK"
+DEFAULT_POOL_SIZE = 8
+
+
+class SessionPool:
+    """
+    Pool of pybatfish sessions connected to one Batfish server.
+
+    Sessions hold no active snapshot that matters to Bat-Q: every query names
+    its snapshot explicitly, so any session can serve any user or thread.
+    Question templates are loaded the first time a session asks a question.
+    """
+
+    def __init__(self, host, network=DEFAULT_NETWORK, size=DEFAULT_POOL_SIZE):
+        self.host = host
+        self.network = network
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._loaded = set()  # ids of sessions with question templates
+        self._lock = threading.Lock()
+
+    def _create(self):
+        from pybatfish.client.session import Session
+
+        session = Session(host=self.host, load_questions=False)
+        session.set_network(self.network)
+        return session
+
+    def _load_questions(self, session):
+        if id(session) not in self._loaded:
+            session.q.load()
+            self._loaded.add(id(session))
+
+    def acquire(self):
+        """
+        Returns an idle session, creating one if the pool is not full.
+        Blocks until a session is released otherwise.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+
+        if not create:
+            return self._idle.get()
+
+        try:
+            return self._create()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, session):
+        self._idle.put(session)
+
+    @contextmanager
+    def session(self, questions=False):
+        """
+        Context manager that borrows a session. Set questions to use the
+        question templates of the session (session.q).
+        """
+        session = self.acquire()
+        try:
+            if questions:
+                self._load_questions(session)
+            yield session
+        finally:
+            self.release(session)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_hosts():
+    """
+    Returns the Batfish servers, given as a comma-separated list in the
+    BATFISH_SERVER environment variable.
+    """
+    hosts = [h.strip() for h in (os.getenv("BATFISH_SERVER") or "").split(",")]
+    return [h for h in hosts if h] or ["127.0.0.1"]
+
+
+def get_host():
+    return get_hosts()[0]
+
+
+def get_pool(host=None, network=DEFAULT_NETWORK):
+    """
+    Returns the session pool of a Batfish server. The pool size is set with
+    the BATQ_SESSIONS environment variable.
+    """
+    host = host or get_host()
+    with _pools_lock:
+        pool = _pools.get((host, network))
+        if pool is None:
+            size = int(os.getenv("BATQ_SESSIONS") or DEFAULT_POOL_SIZE)
+            pool = SessionPool(host, network, size)
+            _pools[(host, network)] = pool
+        return pool
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Spreads snapshots and questions over several Batfish servers (shards).
+Each snapshot is uploaded to one or more servers and every request goes to
+the least loaded healthy server that has the snapshots it needs.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from pages.common.sessions import DEFAULT_NETWORK, get_pool
+
+DEFAULT_RETRY_AFTER = 30
+MAX_BACKOFF = 8
+DEFAULT_SPOOL = os.path.join("~", ".batq", "uploads")
+shard_columns = ["Server", "Healthy", "Running", "Failures", "Snapshots"]
+
+
+def connection_errors():
+    """
+    Returns the exceptions that mean a server could not be reached. Other
+    errors, e.g. HTTP errors for bad questions or snapshots, are answers of
+    the server and do not count against its health.
+    """
+    from requests.exceptions import ConnectionError, Timeout
+
+    return (ConnectionError, Timeout)
+
+
+class Shard:
+    """
+    A Batfish server with its session pool, load and health.
+    """
+
+    def __init__(self, host, network=DEFAULT_NETWORK):
+        self.host = host
+        self.pool = get_pool(host, network)
+        self.running = 0  # requests in progress or waiting for a session
+        self.failures = 0  # consecutive connection failures
+        self.down_until = 0.0
+
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+
+class ShardRouter:
+    """
+    Places snapshots on Batfish servers and routes requests to them.
+
+    Uploads go to `replicas` servers (one by default), one after another, and
+    every replica parses the snapshot. If a snapshot is not on every server,
+    its upload is kept in a spool directory, so it can be copied to another
+    server when a request needs it there, e.g. to compare it with a snapshot
+    placed elsewhere. A server that fails with a connection error is skipped
+    for retry_after seconds, doubled for every consecutive failure.
+    """
+
+    def __init__(
+        self,
+        hosts,
+        replicas=None,
+        retry_after=DEFAULT_RETRY_AFTER,
+        spool=DEFAULT_SPOOL,
+    ):
+        self.shards = [Shard(host) for host in hosts]
+        self.replicas = min(replicas or 1, len(self.shards))
+        self.retry_after = retry_after
+        self.spool = None
+        if self.replicas < len(self.shards):
+            self.spool = os.path.expanduser(spool)
+            os.makedirs(self.spool, exist_ok=True)
+
+        self._placement = {}  # snapshot -> hosts that have it
+        self._lock = threading.Lock()
+
+    def _counts(self):
+        # Number of snapshots on each server
+        with self._lock:
+            counts = {shard.host: 0 for shard in self.shards}
+            for hosts in self._placement.values():
+                for host in hosts:
+                    counts[host] += 1
+            return counts
+
+    def by_load(self, shards=None):
+        """
+        Returns the healthy servers, least loaded first, or all servers if
+        none is healthy. Servers with fewer snapshots come first among the
+        servers with the same number of running requests.
+        """
+        shards = self.shards if shards is None else shards
+        healthy = [s for s in shards if s.healthy()]
+        if healthy:
+            counts = self._counts()
+            return sorted(healthy, key=lambda s: (s.running, counts[s.host]))
+        return sorted(shards, key=lambda s: s.down_until)
+
+    @contextmanager
+    def session(self, shard, questions=False):
+        """
+        Context manager that borrows a session of a server and tracks the
+        load and health of the server.
+        """
+        with self._lock:
+            shard.running += 1
+        try:
+            with shard.pool.session(questions) as bf:
+                yield bf
+        except connection_errors():
+            with self._lock:
+                shard.failures += 1
+                backoff = min(2 ** (shard.failures - 1), MAX_BACKOFF)
+                shard.down_until = time.monotonic() + self.retry_after * backoff
+            raise
+        else:
+            with self._lock:
+                shard.failures = 0
+                shard.down_until = 0.0
+        finally:
+            with self._lock:
+                shard.running -= 1
+
+    def _run(self, shards, fn, questions=False):
+        """
+        Calls fn(bf) on the first server that is reachable.
+        Returns the result and the server.
+        """
+        error = None
+        for shard in shards:
+            try:
+                with self.session(shard, questions) as bf:
+                    return fn(bf), shard
+            except connection_errors() as e:
+                error = e
+        raise error or LookupError("No Batfish server is available")
+
+    def call(self, fn, snapshots=(), questions=False):
+        """
+        Calls fn(bf) on the least loaded server that has all the snapshots.
+        """
+        shards = self.locate_all([s for s in snapshots if s])
+        return self._run(self.by_load(shards), fn, questions)[0]
+
+    def hosts_of(self, name):
+        with self._lock:
+            return set(self._placement.get(name, ()))
+
+    def _add(self, name, shard):
+        with self._lock:
+            self._placement.setdefault(name, set()).add(shard.host)
+
+    def _remove(self, name, shard):
+        with self._lock:
+            hosts = self._placement.get(name, set())
+            hosts.discard(shard.host)
+            if not hosts:
+                self._placement.pop(name, None)
+
+    def locate(self, name):
+        """
+        Returns the servers that have a snapshot, asking the servers again
+        if the snapshot is not known.
+        """
+        hosts = self.hosts_of(name)
+        if not hosts:
+            self.refresh()
+            hosts = self.hosts_of(name)
+        return [s for s in self.shards if s.host in hosts]
+
+    def locate_all(self, names):
+        """
+        Returns the servers that have all the snapshots. If there are none,
+        the missing snapshots are copied from the spool to the least loaded
+        server that has some of them.
+        """
+        if not names:
+            return self.shards
+
+        located = [set(self.locate(name)) for name in names]
+        common = set.intersection(*located)
+        if common:
+            return list(common)
+
+        for shard in self.by_load(list(set.union(*located)) or self.shards):
+            missing = [n for n, shards in zip(names, located) if shard not in shards]
+            if all(os.path.exists(self._spool_path(n)) for n in missing):
+                for name in missing:
+                    with open(self._spool_path(name), "rb") as f:
+                        self._upload(shard, f, name)
+                return [shard]
+
+        raise LookupError(f"No Batfish server has all of {', '.join(names)}")
+
+    def refresh(self):
+        """
+        Asks every healthy server for its snapshots and returns all of them.
+        """
+        names = set()
+        for shard in self.by_load():
+            try:
+                with self.session(shard) as bf:
+                    snapshots = set(bf.list_snapshots())
+            except OSError as e:
+                print(e)
+                continue
+
+            with self._lock:
+                for name, hosts in list(self._placement.items()):
+                    if name not in snapshots:
+                        hosts.discard(shard.host)
+                        if not hosts:
+                            del self._placement[name]
+                for name in snapshots:
+                    self._placement.setdefault(name, set()).add(shard.host)
+            names |= snapshots
+        return sorted(names)
+
+    def _spool_path(self, name):
+        if not self.spool:
+            return ""
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.spool, digest + ".zip")
+
+    def _upload(self, shard, upload, name):
+        upload.seek(0)
+        with self.session(shard) as bf:
+            bf.init_snapshot(upload, name=name, overwrite=True)
+        self._add(name, shard)
+
+    def init_snapshot(self, upload, name):
+        """
+        Uploads a snapshot to the least loaded servers, preferring the servers
+        that have an older snapshot with the same name.
+        """
+        previous = self.hosts_of(name)
+        candidates = self.by_load()
+        candidates.sort(key=lambda s: s.host not in previous)
+
+        placed = []
+        error = None
+        for shard in candidates:
+            if len(placed) == self.replicas:
+                break
+            try:
+                self._upload(shard, upload, name)
+                placed.append(shard)
+            except connection_errors() as e:
+                error = e
+
+        if not placed:
+            raise error or LookupError("No Batfish server is available")
+
+        # Older copies elsewhere would answer for the wrong content
+        for shard in self.shards:
+            if shard.host in previous and shard not in placed:
+                self._delete(shard, name)
+
+        if self.spool:
+            upload.seek(0)
+            path = self._spool_path(name)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(upload.read())
+            os.replace(f"{path}.tmp", path)
+            upload.seek(0)
+
+    def fork_snapshot(self, base, name, failed_nodes=None, failed_interfaces=None):
+        """
+        Forks a snapshot on the least loaded server that has the base.
+        """
+
+        def fork(bf):
+            bf.fork_snapshot(
+                base,
+                name,
+                deactivate_nodes=failed_nodes or None,
+                deactivate_interfaces=failed_interfaces or None,
+                overwrite=True,
+            )
+
+        _, shard = self._run(self.by_load(self.locate_all([base])), fork)
+        self._add(name, shard)
+
+    def _delete(self, shard, name):
+        try:
+            with self.session(shard) as bf:
+                bf.delete_snapshot(name)
+            self._remove(name, shard)
+        except OSError as e:
+            print(e)
+
+    def delete_snapshot(self, name):
+        for shard in self.locate(name):
+            self._delete(shard, name)
+
+        if self.spool and os.path.exists(self._spool_path(name)):
+            os.remove(self._spool_path(name))
+
+    def status(self):
+        """
+        Returns the state of the servers as rows with the shard_columns.
+        """
+        counts = self._counts()
+        return [
+            [s.host, s.healthy(), s.running, s.failures, counts[s.host]]
+            for s in self.shards
+        ]
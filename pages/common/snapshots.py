@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import hashlib
+import threading
+
+# Maps snapshot names to the hash of their content. Snapshot names are reused
+# (uploads use overwrite=True), so anything cached per snapshot must be keyed
+# by the content hash instead.
+_lock = threading.Lock()
+_hashes = {}
+_names = {}  # content hash -> snapshot name
+
+CHUNK_SIZE = 1 << 20
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Returns the content hash of a file object, read in chunks so large
+    uploads are not copied in memory. The file is rewound afterwards.
+    """
+    h = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+def derive_hash(base_digest, *parts):
+    """
+    Returns a hash for a snapshot derived from another one (e.g. a fork).
+    """
+    h = hashlib.sha256(base_digest.encode())
+    for part in parts:
+        h.update(b"\0" + str(part).encode())
+    return h.hexdigest()
+
+
+def register_snapshot(name, digest):
+    with _lock:
+        old = _hashes.get(name)
+        if _names.get(old) == name:
+            del _names[old]
+        _hashes[name] = digest
+        _names[digest] = name
+
+
+def forget_snapshot(name):
+    with _lock:
+        digest = _hashes.pop(name, None)
+        if _names.get(digest) == name:
+            del _names[digest]
+
+
+def get_snapshot_hash(name):
+    """
+    Returns the content hash of a snapshot or None if it is not known.
+    """
+    with _lock:
+        return _hashes.get(name)
+
+
+def find_snapshot(digest):
+    """
+    Returns the name of a snapshot with the given content hash or None.
+    """
+    with _lock:
+        return _names.get(digest)
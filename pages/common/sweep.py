@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright 2023 Maen Artimy
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import hashlib
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pages.common.queries import (
+    fork_registry,
+    get_max_workers,
+    run_queries,
+    run_query,
+)
+from pages.common.metrics import submit
+
+DEFAULT_SCENARIO_LIMIT = 100
+
+trace_columns = [
+    "Traces",
+    "Forward_Traces",
+    "Reverse_Traces",
+]
+
+success_dispositions = {"ACCEPTED", "DELIVERED_TO_SUBNET", "EXITS_NETWORK"}
+
+
+def enumerate_scenarios(nodes=(), interfaces=(), k=1, limit=None):
+    """
+    Returns failure scenarios as (failed_nodes, failed_interfaces) pairs.
+
+    Every combination of up to k components is listed, single failures first.
+    At most `limit` scenarios are returned.
+    """
+    components = [(True, n) for n in nodes] + [(False, i) for i in interfaces]
+    scenarios = []
+
+    for size in range(1, k + 1):
+        for combo in combinations(components, size):
+            if limit and len(scenarios) >= limit:
+                return scenarios
+            scenarios.append(
+                (
+                    [c for is_node, c in combo if is_node],
+                    [c for is_node, c in combo if not is_node],
+                )
+            )
+
+    return scenarios
+
+
+def scenario_name(scenario):
+    failed_nodes, failed_interfaces = scenario
+    return ", ".join(str(c) for c in [*failed_nodes, *failed_interfaces])
+
+
+def count_failed_flows(rows):
+    """
+    Returns the number of flows with at least one trace that was not
+    delivered, or None if the answer has no traces.
+    """
+    failed = None
+    for row in rows:
+        traces = [t for col in trace_columns for t in row.get(col) or []]
+        if not traces:
+            continue
+        failed = failed or 0
+        if any(t.get("disposition") not in success_dispositions for t in traces):
+            failed += 1
+    return failed
+
+
+def rows_digest(rows):
+    """
+    Returns a digest of the rows of an answer that does not depend on the
+    order of the rows.
+    """
+    hashes = sorted(
+        hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode()).digest()
+        for row in rows
+    )
+    return hashlib.sha256(b"".join(hashes)).hexdigest()
+
+
+def summarize_answer(answer):
+    """
+    Returns the row count, a digest of the rows and the failed flows of an
+    answer. The values are None if there is no answer (the query failed).
+    """
+    if answer is None:
+        return {"Rows": None, "Digest": None, "Failed_Flows": None}
+
+    rows = answer.rows
+    digest = rows_digest(rows)
+    return {
+        "Rows": len(rows),
+        "Digest": digest,
+        "Failed_Flows": count_failed_flows(rows),
+    }
+
+
+def evaluate_scenario(base, questions, scenario, baseline):
+    """
+    Forks the base snapshot for one scenario and compares the answers to the
+    baseline. Returns one record per question.
+    """
+    failed_nodes, failed_interfaces = scenario
+    records = []
+
+    with fork_registry.lease(base, failed_nodes, failed_interfaces) as fork:
+        for idx, question in enumerate(questions):
+            summary = summarize_answer(run_query(question, snapshot=fork))
+            reference = baseline[idx]
+
+            # A failed query is neither changed nor unchanged
+            error = None
+            if reference["Digest"] is None:
+                error = "No answer for the base snapshot"
+            elif summary["Digest"] is None:
+                error = "No answer for the failure scenario"
+
+            records.append(
+                {
+                    "Scenario": scenario_name(scenario),
+                    "Question": question["name"],
+                    "Changed": (
+                        None if error else summary["Digest"] != reference["Digest"]
+                    ),
+                    "Rows": summary["Rows"],
+                    "Row_Delta": (
+                        summary["Rows"] - reference["Rows"]
+                        if summary["Rows"] is not None
+                        and reference["Rows"] is not None
+                        else None
+                    ),
+                    "Failed_Flows": summary["Failed_Flows"],
+                    "Error": error,
+                }
+            )
+
+    return records
+
+
+def run_sweep(base, questions, scenarios, max_workers=None):
+    """
+    Evaluates failure scenarios against the base snapshot with a bounded pool
+    of workers.
+
+    Yields the records of each scenario as soon as it is evaluated.
+    """
+    baseline = {
+        idx: summarize_answer(answer)
+        for idx, answer in run_queries(questions, snapshot=base)
+    }
+
+    workers = max(1, min(max_workers or get_max_workers(), len(scenarios)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            submit(executor, evaluate_scenario, base, questions, s, baseline)
+            for s in scenarios
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def resilience_matrix(records):
+    """
+    Returns a scenario x question matrix of changed answers.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame(records)
+    if frame.empty:
+        return frame
+    return frame.pivot(index="Scenario", columns="Question", values="Changed")
@@ -79,6 +79,28 @@ def convert_template(input_data):
     return output
 
 
+def arrow_safe(df):
+    """
+    Returns a copy of a frame that can be written to Parquet/Arrow files.
+    Object columns that hold lists, dicts or pybatfish objects are converted
+    to strings.
+    """
+    df = df.copy()
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].map(
+                lambda v: v if v is None or isinstance(v, str) else str(v)
+            )
+    return df
+
+
+def safe_name(name):
+    """
+    Returns a name that can be used as a file name.
+    """
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "_"
+
+
 if __name__ == "__main__":
     # Test cases
     items = ["How", "Why", "Why_3", "Why_12", "What"]